@@ -0,0 +1,252 @@
+"""Tk-free question engine and scoring rules for Math Mania.
+
+The quiz window and the simulator both play through QuizSession, so the
+10/5 point rules, the two attempts and the final ranks live only here.
+
+    python engine.py --difficulty Moderate --sessions 100000 --skill 0.8 --seed 7
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from collections import Counter
+
+import portfolio  # noqa: F401 (the shared modules below live one folder up)
+from latency import latency_summary
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# --- rules ---
+QUESTIONS = 10
+MAX_ATTEMPTS = 2
+FIRST_TRY_POINTS = 10
+SECOND_TRY_POINTS = 5
+RANKS = ((90, "A+"), (80, "A"), (70, "B"))
+OPERAND_RANGES = {"Easy": (1, 9), "Moderate": (10, 99), "Advanced": (1000, 9999)}
+
+# --- answer outcomes ---
+CORRECT = "correct"
+RETRY = "retry"
+FAILED = "failed"
+
+
+def points_for(attempts):
+    """Points for a right answer after this many wrong ones."""
+    return FIRST_TRY_POINTS if attempts == 0 else SECOND_TRY_POINTS
+
+
+def rank_for(score):
+    for cutoff, rank in RANKS:
+        if score >= cutoff:
+            return rank
+    return "C"
+
+
+class Problem:
+    """One question, e.g. 12 - 47."""
+    __slots__ = ("a", "op", "b", "answer")
+
+    def __init__(self, a, op, b):
+        self.a = a
+        self.op = op
+        self.b = b
+        self.answer = a + b if op == '+' else a - b
+
+    @property
+    def text(self):
+        return f"{self.a} {self.op} {self.b} = ?"
+
+    def __repr__(self):
+        return f"Problem({self.a} {self.op} {self.b})"
+
+
+def random_operand(difficulty, rng=random):
+    lo, hi = OPERAND_RANGES[difficulty]
+    return rng.randint(lo, hi)
+
+
+def random_operation(rng=random):
+    return rng.choice(['+', '-'])
+
+
+def generate_session(difficulty, seed=None, count=QUESTIONS):
+    """The questions for one quiz. The same seed always gives the same quiz."""
+    rng = random.Random(seed)
+    problems = []
+    for _ in range(count):
+        a, b = random_operand(difficulty, rng), random_operand(difficulty, rng)
+        problems.append(Problem(a, random_operation(rng), b))
+    return problems
+
+
+def generate_batch(difficulty, sessions, seed=None, count=QUESTIONS):
+    """Question sets for many quizzes at once, drawn as whole arrays when NumPy is installed.
+
+    Reproducible for a given seed, but NumPy and the plain fallback draw different
+    sequences, so use generate_session when a quiz has to be replayed exactly.
+    """
+    lo, hi = OPERAND_RANGES[difficulty]
+    if np is None:
+        rng = random.Random(seed)
+        return [generate_session(difficulty, rng.random(), count) for _ in range(sessions)]
+
+    rng = np.random.default_rng(seed)
+    a = rng.integers(lo, hi + 1, size=(sessions, count)).tolist()
+    b = rng.integers(lo, hi + 1, size=(sessions, count)).tolist()
+    plus = (rng.random((sessions, count)) < 0.5).tolist()
+    return [[Problem(x, '+' if p else '-', y) for x, y, p in zip(ra, rb, rp)]
+            for ra, rb, rp in zip(a, b, plus)]
+
+
+class QuizSession:
+    """Score and progress through one quiz, fed one typed answer at a time."""
+
+    def __init__(self, difficulty, problems, seed=None):
+        self.difficulty = difficulty
+        self.problems = problems
+        self.seed = seed
+        self.index = 0
+        self.attempts = 0
+        self.score = 0
+        self.last_points = 0
+
+    @classmethod
+    def start(cls, difficulty, seed=None):
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        return cls(difficulty, generate_session(difficulty, seed), seed)
+
+    @property
+    def current(self):
+        return self.problems[self.index]
+
+    @property
+    def finished(self):
+        return self.index >= len(self.problems)
+
+    @property
+    def max_score(self):
+        return FIRST_TRY_POINTS * len(self.problems)
+
+    @property
+    def rank(self):
+        return rank_for(self.score)
+
+    def answer(self, value):
+        """Marks an answer and returns CORRECT, RETRY or FAILED; the last two mean it was wrong."""
+        self.last_points = 0
+        if value == self.current.answer:
+            self.last_points = points_for(self.attempts)
+            self.score += self.last_points
+            self._next()
+            return CORRECT
+        self.attempts += 1
+        if self.attempts < MAX_ATTEMPTS:
+            return RETRY
+        self._next()
+        return FAILED
+
+    def _next(self):
+        self.index += 1
+        self.attempts = 0
+
+
+class SessionTimings:
+    """Per-question timings for one quiz: how long each question took to draw and to answer.
+
+    The window calls shown() once a question is on screen and answered() for every
+    submitted attempt; answer latency runs from the question (or the previous
+    attempt's feedback) appearing to the answer being submitted.
+    """
+
+    def __init__(self, session, clock=time.perf_counter):
+        self.session = session
+        self.clock = clock
+        self.questions = []
+        self._since = None
+
+    def shown(self, index, render_s):
+        problem = self.session.problems[index]
+        self.questions.append({"question": index + 1, "problem": f"{problem.a} {problem.op} {problem.b}",
+                               "render_ms": round(render_s * 1000, 2), "attempts": []})
+        self._since = self.clock()
+
+    def answered(self, outcome, points=0):
+        now = self.clock()
+        self.questions[-1]["attempts"].append({"outcome": outcome, "points": points,
+                                               "answer_ms": round((now - self._since) * 1000, 2)})
+        self._since = now
+
+    def summary(self):
+        render = [q["render_ms"] / 1000 for q in self.questions]
+        answer = [a["answer_ms"] / 1000 for q in self.questions for a in q["attempts"]]
+        return {"render": latency_summary(render), "answer": latency_summary(answer)}
+
+    def export(self, path):
+        s = self.session
+        report = {"difficulty": s.difficulty, "seed": s.seed, "score": s.score, "rank": s.rank,
+                  "finished": time.strftime("%Y-%m-%d %H:%M:%S"), "summary": self.summary(),
+                  "questions": self.questions}
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+def play(session, skill, rng):
+    """Plays a whole session as a player who gets each attempt right with probability skill."""
+    while not session.finished:
+        right = session.current.answer
+        session.answer(right if rng.random() < skill else right + rng.choice((-10, -1, 1, 10)))
+    return session
+
+
+def simulate(difficulty, sessions, skill=0.8, seed=None):
+    """Plays many sessions and returns (scores, ranks, seconds)."""
+    start = time.perf_counter()
+    rng = random.Random(seed)
+    scores, ranks = [], Counter()
+    for problems in generate_batch(difficulty, sessions, seed):
+        s = play(QuizSession(difficulty, problems), skill, rng)
+        scores.append(s.score)
+        ranks[s.rank] += 1
+    return scores, ranks, time.perf_counter() - start
+
+
+def check(scores, ranks, skill, questions=QUESTIONS):
+    """Compares simulated results with what the rules allow and with the expected average."""
+    problems = []
+    if any(s % SECOND_TRY_POINTS or not 0 <= s <= FIRST_TRY_POINTS * questions for s in scores):
+        problems.append("a score outside 0-100 or not a multiple of 5")
+    if sum(ranks.values()) != len(scores) or Counter(rank_for(s) for s in scores) != ranks:
+        problems.append("ranks do not match the scores")
+    expected = questions * (skill * FIRST_TRY_POINTS + (1 - skill) * skill * SECOND_TRY_POINTS)
+    mean = sum(scores) / len(scores)
+    if len(scores) >= 1000 and abs(mean - expected) > 0.05 * FIRST_TRY_POINTS * questions:
+        problems.append(f"average score {mean:.2f} is far from the expected {expected:.2f}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate Math Mania sessions to check the scoring.")
+    parser.add_argument("--difficulty", choices=sorted(OPERAND_RANGES), default="Easy")
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--skill", type=float, default=0.8, help="chance each attempt is right (0-1)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    scores, ranks, elapsed = simulate(args.difficulty, args.sessions, args.skill, args.seed)
+    print(f"{args.sessions} sessions in {elapsed:.2f}s ({args.sessions / elapsed:,.0f} sessions/sec)")
+    print(f"average score {sum(scores) / len(scores):.2f}")
+    for _, rank in RANKS + ((0, "C"),):
+        print(f"  {rank:<2} {ranks[rank]:>8} ({ranks[rank] / len(scores) * 100:.1f}%)")
+    problems = check(scores, ranks, args.skill)
+    for p in problems:
+        print(f"CHECK FAILED: {p}", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,21 @@
-import tkinter as tk
-from tkinter import messagebox
-import random
-import winsound
 import os
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+import portfolio  # noqa: F401 (the shared modules below live one folder up)
+from startup import PROFILE, run_in_background, read_bytes, place_background
+
+import tkinter as tk
+from tkinter import messagebox
+import argparse
+import time
+
+from audio import AudioService
+from engine import QuizSession, SessionTimings, CORRECT, RETRY
+from scores import ScoreHistory
+
+PROFILE.mark("imports")
+FEEDBACK_MS = 900
+LEADERBOARD_SIZE = 3
 
 def get_path(filename):
     path1 = os.path.join(BASE_DIR, filename)
@@ -15,29 +26,37 @@ def get_path(filename):
     return path2
 
 class MathMania:
-    def __init__(self, root):
+    def __init__(self, root, seed=None, timings_dir=None):
         self.root = root
         self.root.title("MATH MANIA")
         self.root.geometry("800x600")
         self.root.resizable(False, False)
 
         # game workings
-        self.score = 0
-        self.question_count = 0
+        self.seed = seed
+        self.session = None
+        self.timings = None
+        self.timings_dir = timings_dir
+        self.history = ScoreHistory(os.path.join(BASE_DIR, "scores"))
         self.difficulty = ""
-        self.attempts = 0
+        self.accepting = False
 
-        # background
-        try:
-            self.bg_img = tk.PhotoImage(file=get_path("background.png"))
-            self.bg_label = tk.Label(self.root, image=self.bg_img)
-            self.bg_label.place(x=0, y=0, relwidth=1, relheight=1)
-        except Exception as e:
-            print(f"Image Error: {e}")
-            self.root.configure(bg="#E0F7FA")
+        # sounds are decoded once, on the audio thread, while the menu is already up
+        self.audio = AudioService()
+        for name in ("correct.wav", "wrong.wav"):
+            self.audio.load_later(name, get_path(name))
 
+        # background: plain colour until the picture has been read
+        self.root.configure(bg="#E0F7FA")
+        run_in_background(self.root, lambda: read_bytes(get_path("background.png")),
+                          self.set_background, name="background.png")
+
+        self.build_problem_screen()
         self.displayMenu()
 
+    def set_background(self, data):
+        self.bg_label = place_background(self.root, data)
+
     # --- FUNCTIONS ---
 
     def displayMenu(self):
@@ -65,61 +84,81 @@ class MathMania:
         tk.Button(self.root, text="EXIT GAME", bg="#333", fg="white", font=("Arial", 10),
                   command=self.root.quit).pack(pady=30)
 
-    def randomInt(self):
-        """Determines the values based on difficulty."""
-        if self.difficulty == "Easy":
-            return random.randint(1, 9)
-        elif self.difficulty == "Moderate":
-            return random.randint(10, 99)
-        else: # advanced
-            return random.randint(1000, 9999)
-
-    def decideOperation(self):
-        """Randomly decides addition or subtraction."""
-        return random.choice(['+', '-'])
-
-    def displayProblem(self, problem_text):
-        """Displays the question and accepts answer."""
-        self.clear_screen()
-
-        # problem container
+    def build_problem_screen(self):
+        """Builds the question box once; every question just updates its labels."""
         box = tk.Frame(self.root, bg="white", bd=3, relief="solid", padx=60, pady=50)
-        box.pack(expand=True)
+        self.problem_box = box
 
-        tk.Label(box, text=f"Question {self.question_count + 1} of 10", bg="white", font=("Arial", 10)).pack()
-        tk.Label(box, text=problem_text, font=("Arial", 35, "bold"), bg="white").pack(pady=20)
+        self.count_lbl = tk.Label(box, bg="white", font=("Arial", 10))
+        self.count_lbl.pack()
+        self.problem_lbl = tk.Label(box, font=("Arial", 35, "bold"), bg="white")
+        self.problem_lbl.pack(pady=20)
 
         self.ans_entry = tk.Entry(box, font=("Arial", 24), justify="center", width=10)
         self.ans_entry.pack(pady=10)
-        self.ans_entry.focus_set()
 
         # submit
-        tk.Button(box, text="SUBMIT", bg="#00C853", fg="white", font=("Arial", 12, "bold"),
-                  width=15, height=2, command=self.check_logic).pack(pady=20)
-        
+        self.submit_btn = tk.Button(box, text="SUBMIT", bg="#00C853", fg="white", font=("Arial", 12, "bold"),
+                                    width=15, height=2, command=self.check_logic)
+        self.submit_btn.pack(pady=(20, 5))
+
+        # answer feedback shows here instead of in a popup
+        self.feedback_lbl = tk.Label(box, bg="white", font=("Arial", 12, "bold"))
+        self.feedback_lbl.pack()
+
         # allow 'Enter' key to submit
         self.root.bind('<Return>', lambda event: self.check_logic())
 
+    def displayProblem(self, problem_text):
+        """Displays the question and accepts answer."""
+        start = time.perf_counter()
+        self.clear_screen()
+        if not self.problem_box.winfo_ismapped():
+            self.problem_box.pack(expand=True)
+
+        self.count_lbl.config(text=f"Question {self.session.index + 1} of {len(self.session.problems)}")
+        self.problem_lbl.config(text=problem_text)
+        self.feedback_lbl.config(text="")
+        self.ans_entry.config(state="normal")
+        self.ans_entry.delete(0, tk.END)
+        self.ans_entry.focus_set()
+        self.submit_btn.config(state="normal")
+        self.accepting = True
+
+        # draw now so the timing covers the frame the player actually sees
+        self.root.update_idletasks()
+        self.timings.shown(self.session.index, time.perf_counter() - start)
+
+    def show_feedback(self, text, colour):
+        self.feedback_lbl.config(text=text, fg=colour)
+
     def isCorrect(self, user_val):
-        """Checks correctness and plays sounds."""
-        if user_val == self.target_ans:
+        """Checks correctness, plays sounds and returns the engine's outcome."""
+        outcome = self.session.answer(user_val)
+        self.timings.answered(outcome, self.session.last_points)
+        if outcome == CORRECT:
             self.play_sound("correct.wav")
-            points = 10 if self.attempts == 0 else 5
-            self.score += points
-            messagebox.showinfo("Result", f"Correct! You earned {points} points.")
-            return True
+            self.show_feedback(f"Correct! You earned {self.session.last_points} points.", "#00C853")
         else:
             self.play_sound("wrong.wav")
-            return False
+        return outcome
 
     def displayResults(self):
         """Outputs final score and ranking."""
-        if self.score >= 90: rank = "A+"
-        elif self.score >= 80: rank = "A"
-        elif self.score >= 70: rank = "B"
-        else: rank = "C"
+        s = self.session
+        self.accepting = False
+        self.export_timings()
 
-        result_msg = f"Final Score: {self.score}/100\nRank: {rank}\n\nWould you like to play again?"
+        board = self.history.board(s.difficulty)
+        try:
+            position = board.record(s.score, s.seed)
+            best = "\n".join(f"  {i}. {score} pts" for i, (score, _, _) in enumerate(board.top(LEADERBOARD_SIZE), 1))
+            standing = f"\n\n{s.difficulty} leaderboard: #{position} of {board.total}\n{best}"
+        except OSError as e:
+            print(f"Score Log Error: {e}")
+            standing = ""
+
+        result_msg = f"Final Score: {s.score}/{s.max_score}\nRank: {s.rank}{standing}\n\nWould you like to play again?"
         if messagebox.askyesno("Quiz Finished", result_msg):
             self.displayMenu()
         else:
@@ -129,51 +168,73 @@ class MathMania:
 
     def start_quiz(self, level):
         self.difficulty = level
-        self.score = 0
-        self.question_count = 0
+        # questions come from the seeded engine, so any quiz can be replayed with --seed
+        self.session = QuizSession.start(level, self.seed)
+        self.timings = SessionTimings(self.session)
+        # read past scores while the quiz is being played
+        self.history.preload(level)
         self.generate_new_problem()
 
     def generate_new_problem(self):
-        if self.question_count < 10:
-            self.attempts = 0
-            n1, n2 = self.randomInt(), self.randomInt()
-            op = self.decideOperation()
-            self.target_ans = n1 + n2 if op == '+' else n1 - n2
-            self.displayProblem(f"{n1} {op} {n2} = ?")
+        if not self.session.finished:
+            self.displayProblem(self.session.current.text)
         else:
             self.displayResults()
 
     def check_logic(self):
+        if not self.accepting:
+            return
         try:
             val = int(self.ans_entry.get())
-            if self.isCorrect(val):
-                self.question_count += 1
-                self.generate_new_problem()
-            else:
-                self.attempts += 1
-                if self.attempts < 2:
-                    messagebox.showwarning("Incorrect", "Incorrect Answer! One more chance remaining.")
-                    self.ans_entry.delete(0, tk.END)
-                else:
-                    messagebox.showerror("Failed", f"Incorrect. The answer was {self.target_ans}")
-                    self.question_count += 1
-                    self.generate_new_problem()
         except ValueError:
-            messagebox.showwarning("Input Error", "Please enter a valid number!")
+            self.show_feedback("Please enter a valid number!", "#E65100")
+            return
+        problem = self.session.current
+        outcome = self.isCorrect(val)
+        if outcome == RETRY:
+            self.show_feedback("Incorrect Answer! One more chance remaining.", "#E65100")
+            self.ans_entry.delete(0, tk.END)
+            return
+        if outcome != CORRECT:
+            self.show_feedback(f"Incorrect. The answer was {problem.answer}", "#D50000")
+
+        # leave the feedback up for a moment, without blocking the window
+        self.accepting = False
+        self.ans_entry.config(state="disabled")
+        self.submit_btn.config(state="disabled")
+        self.root.after(FEEDBACK_MS, self.generate_new_problem)
+
+    def export_timings(self):
+        if not self.timings_dir:
+            return
+        os.makedirs(self.timings_dir, exist_ok=True)
+        name = f"session-{time.strftime('%Y%m%d-%H%M%S')}-{self.session.seed}.json"
+        try:
+            self.timings.export(os.path.join(self.timings_dir, name))
+        except OSError as e:
+            print(f"Timing Export Error: {e}")
 
     def play_sound(self, file):
-        try:
-            path = get_path(file)
-            winsound.PlaySound(path, winsound.SND_FILENAME | winsound.SND_ASYNC)
-        except:
-            pass
+        self.audio.play(file)
 
     def clear_screen(self):
         for widget in self.root.winfo_children():
-            if widget != getattr(self, 'bg_label', None):
+            if widget == getattr(self, 'problem_box', None):
+                widget.pack_forget()
+            elif widget != getattr(self, 'bg_label', None):
                 widget.destroy()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Math Mania")
+    parser.add_argument("--seed", type=int, help="replay the same questions every quiz")
+    parser.add_argument("--timings", metavar="DIR", help="save per-question render/answer timings here")
+    parser.add_argument("--profile-startup", action="store_true", help="print start-up timings")
+    args = parser.parse_args()
+    PROFILE.enabled = args.profile_startup
+
     root = tk.Tk()
-    app = MathMania(root)
+    PROFILE.mark("tk root")
+    app = MathMania(root, seed=args.seed, timings_dir=args.timings)
+    PROFILE.mark("app init")
+    PROFILE.watch(root)
     root.mainloop()
\ No newline at end of file
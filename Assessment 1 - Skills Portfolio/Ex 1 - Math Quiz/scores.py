@@ -0,0 +1,136 @@
+"""Score history and leaderboards for Math Mania, one append-only log per difficulty.
+
+Every finished quiz appends a line "score,unix time,seed". Scores only take
+the values 0-100, so a leaderboard is a count per score plus a small heap of
+the best entries; positions are answered from the counts. Once a log holds more
+than COMPACT_AFTER entries that are not on the board, it is rewritten as
+"=score,count" summary lines plus the kept entries, so the file (and load time)
+stays small however many games are played.
+"""
+import heapq
+import os
+import threading
+import time
+
+from engine import FIRST_TRY_POINTS, QUESTIONS
+
+MAX_SCORE = FIRST_TRY_POINTS * QUESTIONS
+TOP_KEEP = 100
+COMPACT_AFTER = 5000
+
+
+class Leaderboard:
+    """Scores for one difficulty. Loads its log on first use."""
+
+    def __init__(self, path, top_keep=TOP_KEEP, compact_after=COMPACT_AFTER):
+        self.path = path
+        self.top_keep = top_keep
+        self.compact_after = compact_after
+        self.counts = [0] * (MAX_SCORE + 1)
+        self.total = 0
+        self._best = []   # min-heap of (score, -when, -n, seed); the root is the weakest kept entry
+        self._detail = 0  # entries written out in full in the log
+        self._n = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            if os.path.exists(self.path):
+                with open(self.path, "r") as f:
+                    for line in f:
+                        self._read_line(line.strip())
+            self._loaded = True
+        if self.needs_compaction():
+            self.compact()
+
+    def _read_line(self, line):
+        if not line:
+            return
+        try:
+            if line.startswith("="):
+                score, count = (int(x) for x in line[1:].split(","))
+                self.counts[score] += count
+                self.total += count
+                return
+            score, when, seed = line.split(",")
+            self._add(int(score), float(when), int(seed) if seed else None)
+            self._detail += 1
+        except (ValueError, IndexError):
+            pass  # skip a damaged line, e.g. one cut short by a crash
+
+    def _add(self, score, when, seed):
+        self.counts[score] += 1
+        self.total += 1
+        self._n += 1
+        entry = (score, -when, -self._n, seed)
+        if len(self._best) < self.top_keep:
+            heapq.heappush(self._best, entry)
+        elif entry > self._best[0]:
+            heapq.heapreplace(self._best, entry)
+
+    def record(self, score, seed=None, when=None):
+        """Appends a finished quiz and returns its leaderboard position."""
+        self.load()
+        when = time.time() if when is None else when
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(f"{score},{when:.0f},{'' if seed is None else seed}\n")
+            self._add(score, round(when), seed)
+            self._detail += 1
+        if self.needs_compaction():
+            self.compact()
+        return self.position(score)
+
+    def position(self, score):
+        """1 + the number of games that scored strictly higher."""
+        self.load()
+        return 1 + sum(self.counts[score + 1:])
+
+    def top(self, n=10):
+        """The best n games as (score, unix time, seed), earliest first among equal scores."""
+        self.load()
+        return [(score, -when, seed) for score, when, _, seed in heapq.nlargest(n, self._best)]
+
+    def needs_compaction(self):
+        return self._detail - len(self._best) > self.compact_after
+
+    def compact(self):
+        """Folds every entry that is off the board into per-score counts."""
+        with self._lock:
+            kept = sorted(self._best, reverse=True)
+            folded = list(self.counts)
+            for score, *_ in kept:
+                folded[score] -= 1
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                for score, count in enumerate(folded):
+                    if count:
+                        f.write(f"={score},{count}\n")
+                for score, when, _, seed in kept:
+                    f.write(f"{score},{-when:.0f},{'' if seed is None else seed}\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            self._detail = len(kept)
+
+
+class ScoreHistory:
+    """One Leaderboard per difficulty, stored as scores_<difficulty>.log in folder."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.boards = {}
+
+    def board(self, difficulty):
+        if difficulty not in self.boards:
+            path = os.path.join(self.folder, f"scores_{difficulty.lower()}.log")
+            self.boards[difficulty] = Leaderboard(path)
+        return self.boards[difficulty]
+
+    def preload(self, difficulty):
+        """Reads a board's log on a background thread so the results screen never waits for it."""
+        threading.Thread(target=self.board(difficulty).load, daemon=True).start()
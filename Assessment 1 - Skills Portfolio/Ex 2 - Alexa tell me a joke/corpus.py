@@ -0,0 +1,127 @@
+"""Disk-backed joke corpus for files too big to load into a list.
+
+JokeCorpus keeps a "<file>.idx" next to the jokes file holding the byte offset
+of every joke line. Both files are memory-mapped, so opening a corpus costs the
+same for ten jokes or ten million, and corpus[i] is one offset lookup plus one
+slice. The index is rebuilt whenever the jokes file's size or mtime changes.
+"""
+import mmap
+import os
+import struct
+from array import array
+
+INDEX_SUFFIX = ".idx"
+MAGIC = b"JOKEIDX1"
+HEADER = struct.Struct("<8sQQQ")  # magic, source size, source mtime_ns, joke count
+OFFSET = struct.Struct("<Q")
+
+
+def parse_joke(line):
+    """Splits "setup? punchline" into (setup?, punchline), or None if the line is not a joke."""
+    if "?" not in line:
+        return None
+    setup, punch = line.split("?", 1)
+    return setup.strip() + "?", punch.strip()
+
+
+def read_jokes(path):
+    """Every joke in a small jokes file, as a list of (setup, punchline)."""
+    jokes = []
+    with open(path, "r") as f:
+        for line in f:
+            joke = parse_joke(line)
+            if joke:
+                jokes.append(joke)
+    return jokes
+
+
+def _map(f):
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class JokeCorpus:
+    """A read-only sequence of (setup, punchline) pairs backed by the jokes file and its index."""
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        self.count = 0
+        self._stamp = None
+        self._files = []
+        self._text = None
+        self._index = None
+
+    def open(self):
+        """Maps the corpus, building or rebuilding the index first if it is missing or stale."""
+        self.close()
+        st = os.stat(self.path)
+        self._stamp = (st.st_size, st.st_mtime_ns)
+        if not self._index_matches():
+            self.build_index()
+
+        idx = open(self.index_path, "rb")
+        self._files.append(idx)
+        self._index = _map(idx)
+        self.count = HEADER.unpack_from(self._index)[3]
+        if st.st_size:
+            text = open(self.path, "rb")
+            self._files.append(text)
+            self._text = _map(text)
+        return self
+
+    def _index_matches(self):
+        try:
+            with open(self.index_path, "rb") as f:
+                magic, size, mtime_ns, count = HEADER.unpack(f.read(HEADER.size))
+                expected = HEADER.size + count * OFFSET.size
+                return (magic == MAGIC and (size, mtime_ns) == self._stamp
+                        and os.fstat(f.fileno()).st_size == expected)
+        except (OSError, struct.error):
+            return False
+
+    def build_index(self):
+        """One streaming pass over the jokes file, written atomically to the .idx file."""
+        tmp = self.index_path + ".tmp"
+        count = 0
+        with open(self.path, "rb") as src, open(tmp, "wb") as out:
+            out.write(HEADER.pack(MAGIC, 0, 0, 0))
+            offsets = array("Q")
+            pos = 0
+            for line in src:
+                if b"?" in line:
+                    offsets.append(pos)
+                pos += len(line)
+                if len(offsets) >= 65536:
+                    count += len(offsets)
+                    offsets.tofile(out)
+                    offsets = array("Q")
+            count += len(offsets)
+            offsets.tofile(out)
+            out.seek(0)
+            out.write(HEADER.pack(MAGIC, *self._stamp, count))
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp, self.index_path)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError("joke index out of range")
+        start = OFFSET.unpack_from(self._index, HEADER.size + i * OFFSET.size)[0]
+        end = self._text.find(b"\n", start)
+        line = self._text[start:end if end != -1 else len(self._text)]
+        return parse_joke(line.decode("utf-8", errors="replace"))
+
+    def close(self):
+        for m in (self._text, self._index):
+            if m is not None:
+                m.close()
+        for f in self._files:
+            f.close()
+        self._files = []
+        self._text = self._index = None
+        self.count = 0
@@ -1,19 +1,26 @@
-import tkinter as tk
-from tkinter import messagebox
-import random
-import winsound
 import os
-import threading 
 
 # --- PATH SETUP ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+import portfolio  # noqa: F401 (the shared modules below live one folder up)
+from startup import PROFILE, run_in_background, read_bytes, place_background
+
+import tkinter as tk
+from tkinter import messagebox
+import argparse
+
+from audio import AudioService
+from corpus import JokeCorpus, read_jokes
+from ratings import RatingStore, JokeSampler
+
+PROFILE.mark("imports")
 
 def get_res(filename):
     path = os.path.join(BASE_DIR, filename)
     return path if os.path.exists(path) else None
 
 class JokeMaster3000:
-    def __init__(self, root):
+    def __init__(self, root, corpus_path=None):
         self.root = root
         self.root.title("JOKEMASTER3000")
         self.root.geometry("940x788")
@@ -29,38 +36,53 @@ class JokeMaster3000:
         self.c_red = "#FF5757"
         self.c_yellow = "#FFDE59"
 
-        self.jokes = self.load_jokes()
-        
+        # jokes, ratings and the background are read after the menu is up
+        self.jokes = None
+        self.ratings = None
+        self.sampler = None
+        self.joke_index = None
+        self.my_stars = None
+        self.joke_btn = None
+        run_in_background(self.root, lambda: self.load_library(corpus_path), self.library_ready, name="jokes")
+
+        self.root.configure(bg=self.bg_pink)
         bg_path = get_res("backgrounds.png") 
         if bg_path:
-            self.bg_img = tk.PhotoImage(file=bg_path)
-            self.bg_label = tk.Label(self.root, image=self.bg_img)
-            self.bg_label.place(x=0, y=0, relwidth=1, relheight=1)
+            run_in_background(self.root, lambda: read_bytes(bg_path), self.set_background, name="backgrounds.png")
+
+        # one audio thread; music keeps looping while the laugh plays over it
+        self.audio = AudioService()
+        self.audio.load_later("music", get_res("music.wav"))
+        self.audio.load_later("laugh", get_res("laugh.wav"))
 
         self.start_bg_music()
         self.main_menu()
 
+    def load_library(self, corpus_path):
+        """Runs off the Tk thread: the jokes, their ratings and the sampler built from them."""
+        # a big corpus stays on disk behind its offset index; both are indexed the same way
+        jokes = JokeCorpus(corpus_path).open() if corpus_path else self.load_jokes()
+        jokes_path = corpus_path or os.path.join(BASE_DIR, "jokes.txt")
+        ratings = RatingStore(jokes_path + ".ratings").load(jokes)
+        return jokes, ratings, JokeSampler(len(jokes), ratings)
+
+    def library_ready(self, library):
+        self.jokes, self.ratings, self.sampler = library
+        if self.joke_btn is not None and self.joke_btn.winfo_exists() and len(self.jokes):
+            self.joke_btn.config(state="normal")
+
+    def set_background(self, data):
+        self.bg_label = place_background(self.root, data)
+
     def load_jokes(self):
-        jokes_list = []
         path = get_res("jokes.txt")
-        if path:
-            with open(path, "r") as f:
-                for line in f:
-                    if "?" in line:
-                        parts = line.split("?", 1)
-                        jokes_list.append((parts[0].strip() + "?", parts[1].strip()))
-        return jokes_list
+        return read_jokes(path) if path else []
 
     def start_bg_music(self):
-        music_path = get_res("music.wav")
-        if music_path:
-            winsound.PlaySound(music_path, winsound.SND_FILENAME | winsound.SND_ASYNC | winsound.SND_LOOP)
+        self.audio.loop("music")
 
-    def play_laugh_and_resume(self):
-        laugh_path = get_res("laugh.wav")
-        if laugh_path:
-            winsound.PlaySound(laugh_path, winsound.SND_FILENAME)
-            self.start_bg_music()
+    def play_laugh(self):
+        self.audio.play("laugh")
 
     def main_menu(self):
         self.clear()
@@ -73,15 +95,22 @@ class JokeMaster3000:
 
         btn_style = {"font": ("Comic Sans MS", 14, "bold"), "width": 25, "height": 2, "bd": 0, "cursor": "hand2"}
         
-        tk.Button(self.root, text="ALEXA, TELL ME A JOKE", bg=self.c_blue, fg="white", 
-                  activebackground=self.c_blue, command=self.next_joke, **btn_style).pack(pady=15)
+        # usable once the jokes have loaded
+        ready = self.jokes is not None and len(self.jokes) > 0
+        self.joke_btn = tk.Button(self.root, text="ALEXA, TELL ME A JOKE", bg=self.c_blue, fg="white",
+                                  activebackground=self.c_blue, command=self.next_joke,
+                                  state="normal" if ready else "disabled", **btn_style)
+        self.joke_btn.pack(pady=15)
         
         tk.Button(self.root, text="QUIT", bg=self.c_red, fg="white", 
                   activebackground=self.c_red, command=self.root.quit, **btn_style).pack(pady=15)
 
     def next_joke(self):
         self.clear()
-        setup, self.punch = random.choice(self.jokes)
+        # better-rated jokes come up more often, and never twice in a row
+        self.joke_index = self.sampler.next()
+        self.my_stars = None  # this showing's rating; clicking again changes it
+        setup, self.punch = self.jokes[self.joke_index]
 
         
         tk.Label(self.root, text="READY FOR A LAUGH?", font=("Comic Sans MS", 14, "bold"), 
@@ -118,13 +147,25 @@ class JokeMaster3000:
 
     def reveal(self):
         self.punch_label.config(text=self.punch)
-        threading.Thread(target=self.play_laugh_and_resume, daemon=True).start()
+        self.play_laugh()
         self.btn_reveal.config(state="disabled", bg="#CCCCCC")
 
     def rate(self, index):
         for i, btn in enumerate(self.stars):
             btn.config(text="★" if i <= index else "☆")
-        messagebox.showinfo("JokeMaster", f"You rated this {index + 1} stars!")
+        try:
+            avg = self.ratings.add(self.joke_index, self.jokes[self.joke_index], index + 1,
+                                   replacing=self.my_stars)
+        except OSError as e:
+            messagebox.showerror("JokeMaster", f"Could not save your rating: {e}")
+            return
+        changed = self.my_stars is not None
+        self.my_stars = index + 1
+        self.sampler.rated(self.joke_index)
+        votes = self.ratings.count(self.joke_index)
+        verb = "changed your rating to" if changed else "rated this"
+        messagebox.showinfo("JokeMaster", f"You {verb} {index + 1} stars!\n"
+                                          f"Average: {avg:.1f} from {votes} rating{'s' if votes != 1 else ''}")
 
     def clear(self):
         for w in self.root.winfo_children():
@@ -132,6 +173,15 @@ class JokeMaster3000:
                 w.destroy()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="JokeMaster3000")
+    parser.add_argument("--corpus", help="serve jokes from this (large) file through an on-disk index")
+    parser.add_argument("--profile-startup", action="store_true", help="print start-up timings")
+    args = parser.parse_args()
+    PROFILE.enabled = args.profile_startup
+
     root = tk.Tk()
-    app = JokeMaster3000(root)
+    PROFILE.mark("tk root")
+    app = JokeMaster3000(root, corpus_path=args.corpus)
+    PROFILE.mark("app init")
+    PROFILE.watch(root)
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,108 @@
+"""Load generator for server.py: many concurrent keep-alive clients, one event loop.
+
+    python loadgen.py --clients 500 --duration 10
+    python loadgen.py --unix /tmp/jokes.sock --mix joke=8,setup=1,rating=1
+
+Prints requests/sec and latency percentiles as JSON.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+import portfolio  # noqa: F401 (the shared modules below live one folder up)
+from latency import latency_summary
+from server import DEFAULT_PORT
+
+DEFAULT_MIX = "joke=7,setup=1,punchline=1,rating=1"
+
+
+def build_request(kind, joke_count, rng):
+    i = rng.randrange(joke_count)
+    if kind == "rating":
+        body = json.dumps({"stars": rng.randint(1, 5)}).encode()
+        return (f"POST /joke/{i}/rating HTTP/1.1\r\nHost: jokes\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n").encode() + body
+    path = "/joke" if kind == "joke" else f"/joke/{i}/{kind}"
+    return f"GET {path} HTTP/1.1\r\nHost: jokes\r\n\r\n".encode()
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = 0
+    for line in head.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":", 1)[1])
+    return status, await reader.readexactly(length)
+
+
+async def open_connection(args):
+    if args.unix:
+        return await asyncio.open_unix_connection(args.unix)
+    return await asyncio.open_connection(args.host, args.port)
+
+
+async def client(args, kinds, weights, joke_count, deadline, latencies, errors, seed):
+    rng = random.Random(seed)
+    reader, writer = await open_connection(args)
+    try:
+        while time.perf_counter() < deadline:
+            request = build_request(rng.choices(kinds, weights)[0], joke_count, rng)
+            start = time.perf_counter()
+            writer.write(request)
+            status, _ = await read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors[status] = errors.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def run(args):
+    mix = dict(part.split("=") for part in args.mix.split(","))
+    kinds, weights = list(mix), [float(w) for w in mix.values()]
+
+    reader, writer = await open_connection(args)
+    writer.write(b"GET /health HTTP/1.1\r\nHost: jokes\r\n\r\n")
+    _, body = await read_response(reader)
+    health = json.loads(body)
+    writer.close()
+
+    latencies, errors = [], {}
+    start = time.perf_counter()
+    deadline = start + args.duration
+    results = await asyncio.gather(*(client(args, kinds, weights, health["jokes"], deadline, latencies, errors, i)
+                                     for i in range(args.clients)), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    failed = [r for r in results if isinstance(r, Exception)]
+    return {
+        "clients": args.clients,
+        "seconds": round(elapsed, 2),
+        "requests": len(latencies),
+        "requests_per_s": round(len(latencies) / elapsed),
+        **latency_summary(latencies),
+        "http_errors": errors,
+        "client_failures": len(failed),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the JokeMaster3000 server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", help="connect to this Unix socket instead of TCP")
+    parser.add_argument("--clients", type=int, default=100, help="concurrent keep-alive connections")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds to run")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="request kinds and weights, e.g. joke=9,rating=1")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+    return 1 if report["http_errors"] or report["client_failures"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,10 @@
+"""Puts the portfolio folder, where startup, audio and latency live, on sys.path.
+
+Python only adds a script's own folder, so every script here imports this first.
+"""
+import os
+import sys
+
+SHARED_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SHARED_DIR not in sys.path:
+    sys.path.insert(0, SHARED_DIR)
@@ -0,0 +1,273 @@
+"""Joke ratings and the rating-weighted joke picker.
+
+Ratings are appended to a log as "joke number,text checksum,stars,unix time".
+The checksum ties a rating to the joke text, so ratings for lines that have
+since been edited are dropped when the log is loaded. Like the score logs in
+Math Mania, a long log is folded into "=joke number,checksum,count,total" lines,
+here on a background thread so a rating click never waits for the rewrite. Those
+lines add up like any other, so a changed rating is logged as one with a count of
+0 and the difference in stars.
+
+JokeSampler picks jokes in proportion to their smoothed average rating (unrated
+jokes count as PRIOR_STARS). Rated jokes sit in a Fenwick tree over their
+weights, so a pick and a new rating are both O(log n); the rest all share one
+weight and are drawn uniformly. A window of recent picks stops the same joke
+coming back straight away.
+"""
+import os
+import random
+import threading
+import time
+import zlib
+from collections import deque
+
+PRIOR_STARS = 3.0
+PRIOR_VOTES = 2
+RECENT_WINDOW = 20
+COMPACT_AFTER = 5000  # lines of slack on top of twice the folded size
+
+
+def joke_checksum(joke):
+    setup, punch = joke
+    return zlib.crc32(f"{setup}\0{punch}".encode("utf-8"))
+
+
+class RatingStore:
+    """Per-joke rating counts and totals, backed by an append-only log."""
+
+    def __init__(self, path, compact_after=COMPACT_AFTER):
+        self.path = path
+        self.compact_after = compact_after
+        self.totals = {}  # joke number -> (checksum, count, total stars), replaced rather than changed
+        self._lines = 0
+        self._lock = threading.Lock()
+        self._compactor = None
+
+    def load(self, jokes):
+        """Reads the log, keeping only ratings whose joke text is unchanged in jokes."""
+        self.totals = {}
+        self._lines = 0
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                for line in f:
+                    self._read_line(line.strip())
+        for i in [i for i, (crc, _, _) in self.totals.items()
+                  if i >= len(jokes) or joke_checksum(jokes[i]) != crc]:
+            del self.totals[i]
+        if self.needs_compaction():
+            self.compact()
+        return self
+
+    def _read_line(self, line):
+        if not line:
+            return
+        try:
+            if line.startswith("="):
+                i, crc, count, total = (int(x) for x in line[1:].split(","))
+            else:
+                i, crc, stars, _ = line.split(",")
+                i, crc, count, total = int(i), int(crc), 1, int(stars)
+        except ValueError:
+            return  # skip a damaged line, e.g. one cut short by a crash
+        entry = self.totals.get(i)
+        if entry is None or entry[0] != crc:
+            # first rating, or the line was replaced by a different joke since
+            entry = (crc, 0, 0)
+        self.totals[i] = (crc, entry[1] + count, entry[2] + total)
+        self._lines += 1
+
+    def add(self, i, joke, stars, replacing=None):
+        """Records a 1-5 star rating for joke number i and returns its new average.
+
+        replacing is the stars of a rating this one takes the place of, when
+        someone changes their mind, so it does not count as a second vote.
+        """
+        return self.add_many([(i, joke, stars, replacing)])[0]
+
+    def add_many(self, ratings):
+        """Records (joke number, joke, stars, replacing) ratings with one write; returns each joke's new average."""
+        lines, entries = [], []
+        for i, joke, stars, replacing in ratings:
+            crc = joke_checksum(joke)
+            if replacing is None:
+                lines.append(f"{i},{crc},{stars},{time.time():.0f}\n")
+                entries.append(f"{i},{crc},{stars},0")
+            else:
+                lines.append(f"={i},{crc},0,{stars - replacing}\n")
+                entries.append(lines[-1].rstrip())
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write("".join(lines))
+            for entry in entries:
+                self._read_line(entry)
+        if self.needs_compaction():
+            self.compact()
+        return [self.average(i) for i, _, _, _ in ratings]
+
+    def rated_jokes(self):
+        """Sorted numbers of every rated joke; safe to call from another thread."""
+        with self._lock:
+            return sorted(self.totals)
+
+    def average(self, i):
+        entry = self.totals.get(i)
+        return entry[2] / entry[1] if entry and entry[1] else None
+
+    def count(self, i):
+        entry = self.totals.get(i)
+        return entry[1] if entry else 0
+
+    def weight(self, i):
+        """Average stars pulled towards PRIOR_STARS, so one vote does not decide a joke's fate."""
+        _, count, total = self.totals.get(i, (0, 0, 0))
+        return (total + PRIOR_STARS * PRIOR_VOTES) / (count + PRIOR_VOTES)
+
+    @property
+    def compacting(self):
+        return self._compactor is not None and self._compactor.is_alive()
+
+    def needs_compaction(self):
+        # folding rewrites one line per rated joke, so only fold once the log is
+        # at least twice that long; the work done stays proportional to the ratings added
+        return self._lines > 2 * len(self.totals) + self.compact_after and not self.compacting
+
+    def compact(self):
+        """Folds the log into one line per joke on a background thread."""
+        with self._lock:
+            if self.compacting:
+                return
+            # the entries are immutable, so a shallow copy is a consistent snapshot
+            totals = dict(self.totals)
+            offset = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        self._compactor = threading.Thread(target=self._fold, args=(totals, offset), daemon=True)
+        self._compactor.start()
+
+    def _fold(self, totals, offset):
+        """Writes the folded totals, then carries over ratings added since offset and swaps the file in."""
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            f.writelines(f"={i},{crc},{count},{total}\n" for i, (crc, count, total) in totals.items())
+            f.flush()
+            os.fsync(f.fileno())
+        with self._lock:
+            tail = b""
+            if os.path.exists(self.path):
+                with open(self.path, "rb") as src:
+                    src.seek(offset)
+                    tail = src.read()
+            with open(tmp, "ab") as f:
+                f.write(tail)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            self._lines = len(totals) + tail.count(b"\n")
+
+    def close(self):
+        """Waits for a compaction in progress to finish."""
+        if self._compactor is not None:
+            self._compactor.join()
+
+
+class WeightTree:
+    """Fenwick tree over a growing list of weights.
+
+    Changing or appending a weight and finding which slot a point in
+    [0, total) falls in are O(log n).
+    """
+
+    def __init__(self, weights=()):
+        self.weights = list(weights)
+        self.total = sum(self.weights)
+        tree = [0.0] + self.weights
+        for i in range(1, len(tree)):
+            j = i + (i & -i)
+            if j < len(tree):
+                tree[j] += tree[i]
+        self._tree = tree
+
+    def __len__(self):
+        return len(self.weights)
+
+    def append(self, w):
+        tree = self._tree
+        i = len(tree)
+        # the new cell covers this slot and the (i & -i) - 1 slots before it
+        cell, j, stop = w, i - 1, i - (i & -i)
+        while j > stop:
+            cell += tree[j]
+            j -= j & -j
+        tree.append(cell)
+        self.weights.append(w)
+        self.total += w
+
+    def set(self, slot, w):
+        delta = w - self.weights[slot]
+        self.weights[slot] = w
+        self.total += delta
+        tree = self._tree
+        i = slot + 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def find(self, x):
+        """The slot whose share of [0, total) holds x."""
+        tree = self._tree
+        slot, step = 0, 1 << len(tree).bit_length()
+        while step:
+            i = slot + step
+            if i < len(tree) and tree[i] <= x:
+                slot = i
+                x -= tree[i]
+            step >>= 1
+        # rounding in the running sums can carry x just past the last slot
+        return min(slot, len(self.weights) - 1)
+
+
+class JokeSampler:
+    """Rating-weighted, no-immediate-repeat picks of joke numbers 0..count-1."""
+
+    def __init__(self, count, ratings, rng=random, window=RECENT_WINDOW):
+        self.count = count
+        self.ratings = ratings
+        self.rng = rng
+        self.recent = deque(maxlen=min(window, count // 2))
+        self._lock = threading.Lock()
+        self._rated = ratings.rated_jokes()  # joke number in each tree slot
+        self._slot = {i: slot for slot, i in enumerate(self._rated)}
+        self._tree = WeightTree(ratings.weight(i) for i in self._rated)
+
+    def rated(self, i):
+        """Call after rating joke i, to bring its weight up to date."""
+        w = self.ratings.weight(i)
+        with self._lock:
+            slot = self._slot.get(i)
+            if slot is None:
+                self._slot[i] = len(self._rated)
+                self._rated.append(i)
+                self._tree.append(w)
+            else:
+                self._tree.set(slot, w)
+
+    def _pick(self):
+        with self._lock:
+            tree = self._tree
+            x = self.rng.random() * (tree.total + PRIOR_STARS * (self.count - len(tree)))
+            if x < tree.total:
+                return self._rated[tree.find(x)]
+        # an unrated joke: uniform, retrying on rated ones. The more jokes are
+        # rated the rarer this branch, so it averages under PRIOR_STARS tries a pick
+        while True:
+            i = self.rng.randrange(self.count)
+            if i not in self._slot:
+                return i
+
+    def next(self):
+        if not self.count:
+            raise IndexError("no jokes to pick from")
+        for _ in range(20):
+            i = self._pick()
+            if i not in self.recent:
+                break
+        self.recent.append(i)
+        return i
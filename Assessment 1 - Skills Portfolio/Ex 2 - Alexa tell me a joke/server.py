@@ -0,0 +1,241 @@
+"""Headless JokeMaster3000: the same jokes and ratings served as JSON over HTTP.
+
+    python server.py                         http://127.0.0.1:8300
+    python server.py --corpus big_jokes.txt --port 9000
+    python server.py --unix /tmp/jokes.sock
+
+    GET  /joke                      a rating-weighted random joke: {"id", "setup", "punchline"}
+    GET  /joke/<id>                 one joke
+    GET  /joke/<id>/setup           just the setup, for "tell me a joke"
+    GET  /joke/<id>/punchline       just the punchline, for "why?"
+    POST /joke/<id>/rating          body {"stars": 1-5}; replies with the new average
+    GET  /health
+
+One asyncio event loop serves every client over keep-alive HTTP/1.1
+connections, so thousands of clients do not need a thread each. Ratings are
+appended to the log on a worker thread, so a slow disk never stalls the loop;
+those that arrive while a write is under way go out together in the next one.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from corpus import JokeCorpus, read_jokes
+from ratings import RatingStore, JokeSampler
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PORT = 8300
+MAX_BODY = 4096
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class JokeService:
+    """Routes requests to the joke library; knows nothing about sockets."""
+
+    def __init__(self, jokes, ratings):
+        self.jokes = jokes
+        self.ratings = ratings
+        self.sampler = JokeSampler(len(jokes), ratings)
+        self.started = time.time()
+        self.served = 0
+        # one thread, so ratings reach the log in the order they arrived
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ratings")
+        self._pending = []  # (joke number, stars, future) waiting for the next write
+        self._flusher = None
+
+    def joke(self, i):
+        setup, punch = self.jokes[i]
+        return {"id": i, "setup": setup, "punchline": punch}
+
+    def _index(self, raw):
+        try:
+            i = int(raw)
+        except ValueError:
+            raise HttpError(404, f"no joke '{raw}'")
+        if not 0 <= i < len(self.jokes):
+            raise HttpError(404, f"no joke {i}")
+        return i
+
+    async def handle(self, method, path, body):
+        """Returns (status, JSON-able reply)."""
+        self.served += 1
+        parts = [p for p in path.split("?", 1)[0].split("/") if p]
+        if parts == ["health"]:
+            return 200, {"jokes": len(self.jokes), "served": self.served,
+                         "uptime_s": round(time.time() - self.started, 1)}
+        if not parts or parts[0] != "joke" or len(parts) > 3:
+            raise HttpError(404, "unknown endpoint")
+
+        if len(parts) == 3 and parts[2] == "rating":
+            if method != "POST":
+                raise HttpError(405, "ratings are POSTed")
+            i = self._index(parts[1])
+            try:
+                stars = int(json.loads(body or b"{}")["stars"])
+            except (ValueError, KeyError, TypeError):
+                raise HttpError(400, 'send {"stars": 1-5}')
+            if not 1 <= stars <= 5:
+                raise HttpError(400, "stars must be 1-5")
+            avg = await self._rate(i, stars)
+            return 200, {"id": i, "average": round(avg, 2), "ratings": self.ratings.count(i)}
+
+        if method != "GET":
+            raise HttpError(405, "only GET here")
+        if len(parts) == 1:
+            if not len(self.jokes):
+                raise HttpError(404, "no jokes loaded")
+            return 200, self.joke(self.sampler.next())
+        reply = self.joke(self._index(parts[1]))
+        if len(parts) == 2:
+            return 200, reply
+        if parts[2] not in ("setup", "punchline"):
+            raise HttpError(404, "unknown endpoint")
+        return 200, {"id": reply["id"], parts[2]: reply[parts[2]]}
+
+    async def _rate(self, i, stars):
+        """Queues a rating for the writer and waits until it is in the log; returns the joke's new average."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((i, stars, future))
+        if self._flusher is None or self._flusher.done():
+            self._flusher = loop.create_task(self._flush())
+        return await future
+
+    async def _flush(self):
+        loop = asyncio.get_running_loop()
+        while self._pending:
+            batch, self._pending = self._pending, []
+            ratings = [(i, self.jokes[i], stars, None) for i, stars, _ in batch]
+            try:
+                averages = await loop.run_in_executor(self._writer, self.ratings.add_many, ratings)
+            except OSError as e:
+                for _, _, future in batch:
+                    if not future.done():  # its client may have gone
+                        future.set_exception(e)
+                continue
+            for (i, _, future), avg in zip(batch, averages):
+                self.sampler.rated(i)
+                if not future.done():
+                    future.set_result(avg)
+
+    def close(self):
+        """Finishes any rating appends still queued, and any compaction they started."""
+        self._writer.shutdown()
+        self.ratings.close()
+
+
+def response(status, payload, keep_alive):
+    body = json.dumps(payload).encode()
+    head = (f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode() + body
+
+
+async def read_request(reader):
+    """Parses one request; returns None when the client has hung up."""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, path, version = lines[0].split(" ")
+    except ValueError:
+        raise HttpError(400, "bad request line")
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HttpError(400, "bad Content-Length")
+    if length > MAX_BODY:
+        raise HttpError(413, "body too large")
+    body = await reader.readexactly(length) if length else b""
+    keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+    return method, path, body, keep_alive
+
+
+def make_handler(service):
+    async def handle_client(reader, writer):
+        try:
+            while True:
+                keep_alive = False
+                try:
+                    request = await read_request(reader)
+                    if request is None:
+                        break
+                    method, path, body, keep_alive = request
+                    status, payload = await service.handle(method, path, body)
+                except HttpError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except (asyncio.LimitOverrunError, ValueError):
+                    status, payload = 400, {"error": "bad request"}
+                except OSError as e:
+                    status, payload = 500, {"error": str(e)}
+                writer.write(response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+    return handle_client
+
+
+def load_service(corpus_path=None):
+    jokes_path = corpus_path or os.path.join(BASE_DIR, "jokes.txt")
+    jokes = JokeCorpus(corpus_path).open() if corpus_path else read_jokes(jokes_path)
+    return JokeService(jokes, RatingStore(jokes_path + ".ratings").load(jokes))
+
+
+async def serve(service, host="127.0.0.1", port=DEFAULT_PORT, unix=None, ready=None):
+    handler = make_handler(service)
+    if unix:
+        server = await asyncio.start_unix_server(handler, path=unix, backlog=1024)
+        where = unix
+    else:
+        server = await asyncio.start_server(handler, host, port, backlog=1024)
+        where = "http://%s:%d" % server.sockets[0].getsockname()[:2]
+    print(f"Serving {len(service.jokes)} jokes on {where}", file=sys.stderr)
+    if ready is not None:
+        ready.set_result(server)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve JokeMaster3000 jokes over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--corpus", help="serve jokes from this (large) file through an on-disk index")
+    args = parser.parse_args(argv)
+
+    service = load_service(args.corpus)
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
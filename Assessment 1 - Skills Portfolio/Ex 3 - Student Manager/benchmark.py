@@ -0,0 +1,143 @@
+"""Headless benchmarks for the Student Manager's data layer.
+
+Generates synthetic marks files and times loading, saving, searching, grading and
+the analytics aggregates, then prints the results as JSON:
+
+    python benchmark.py --sizes 1000,100000,1000000 --out results.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import portfolio  # noqa: F401 (the shared modules below live one folder up)
+from latency import latency_summary
+from registry import StudentStore, MarksJournal, Student, read_marks, calc_stats, grade_cohort
+
+FIRST_NAMES = ["John", "Sam", "Lee", "Matt", "Ron", "Jake", "Jo", "Gareth", "Alan", "Les",
+               "Priya", "Omar", "Mei", "Sofia", "Kwame", "Anna", "Luis", "Hana", "Ivan", "Zara"]
+LAST_NAMES = ["Curry", "Sturtivant", "Scott", "Thompson", "Herrema", "Hobbs", "Hyde", "Southgate",
+              "Shearer", "Ferdinand", "Patel", "Haddad", "Chen", "Rossi", "Mensah", "Novak"]
+
+
+def generate(path, n, seed=0):
+    """Writes a studentMarks.txt style file with n random students."""
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        f.write(f"{n}\n")
+        for i in range(n):
+            name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+            f.write(f"{100000 + i},{name},{rng.randint(0, 20)},{rng.randint(0, 20)},"
+                    f"{rng.randint(0, 20)},{rng.randint(0, 100)}\n")
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def peak_memory(fn):
+    """Peak bytes allocated by Python while fn runs."""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_size(n, workdir, queries, seed):
+    path = os.path.join(workdir, f"marks_{n}.txt")
+    _, gen_s = timed(lambda: generate(path, n, seed))
+    result = {"rows": n, "file_bytes": os.path.getsize(path), "generate_s": gen_s}
+
+    store, load_s = timed(lambda: StudentStore(read_marks(path)))
+    result["load"] = {"seconds": load_s, "rows_per_s": n / load_s,
+                      "peak_bytes": peak_memory(lambda: StudentStore(read_marks(path)))}
+    result["stream_parse"] = {"seconds": timed(lambda: sum(1 for _ in read_marks(path)))[1],
+                              "peak_bytes": peak_memory(lambda: sum(1 for _ in read_marks(path)))}
+
+    out = os.path.join(workdir, f"saved_{n}.txt")
+    journal = MarksJournal(out)
+    journal.store = store
+    _, save_s = timed(journal.checkpoint)
+    result["save"] = {"seconds": save_s, "rows_per_s": n / save_s}
+
+    # a mix of ID fragments, name fragments and short prefixes, like people type
+    rng = random.Random(seed + 1)
+    recs = list(store)
+    terms = []
+    for _ in range(queries):
+        s = rng.choice(recs)
+        kind = rng.random()
+        if kind < 0.4:
+            terms.append(s.id[rng.randint(0, 2):])
+        elif kind < 0.8:
+            name = s.name.lower()
+            i = rng.randint(0, max(0, len(name) - 4))
+            terms.append(name[i:i + rng.randint(3, 6)])
+        else:
+            terms.append(s.name[:rng.randint(1, 2)])
+    lat, hits = [], 0
+    for q in terms:
+        found, dt = timed(lambda: store.search(q))
+        lat.append(dt)
+        hits += len(found)
+    result["search"] = {"queries": queries, "avg_hits": hits / queries, **latency_summary(lat)}
+
+    _, calc_s = timed(lambda: [calc_stats(s) for s in recs])
+    result["calc_stats"] = {"seconds": calc_s, "rows_per_s": n / calc_s}
+    _, batch_s = timed(lambda: grade_cohort(recs))
+    result["grade_cohort"] = {"seconds": batch_s, "rows_per_s": n / batch_s}
+
+    # analytics as the dashboard sees it: one edit, then best/worst/average/percentiles
+    lat = []
+    for i in range(min(queries, 200)):
+        store.add(Student(f"x{i}", "Bench Student", rng.randint(0, 20), rng.randint(0, 20),
+                          rng.randint(0, 20), rng.randint(0, 100)))
+        agg = store.stats
+        _, dt = timed(lambda: (agg.highest(), agg.lowest(), agg.average(),
+                               agg.percentile(50), agg.percentile(75)))
+        lat.append(dt)
+    result["analytics"] = latency_summary(lat)
+
+    for p in (path, out):
+        os.remove(p)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Student Manager data layer.")
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="comma-separated row counts, e.g. 1000,1000000,10000000")
+    parser.add_argument("--queries", type=int, default=500, help="search queries per size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": [],
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        for n in (int(x) for x in args.sizes.split(",")):
+            print(f"benchmarking {n} rows...", file=sys.stderr)
+            report["results"].append(bench_size(n, workdir, args.queries, args.seed))
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
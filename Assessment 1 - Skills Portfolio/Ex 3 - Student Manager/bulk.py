@@ -0,0 +1,179 @@
+"""Headless bulk import/export for the student registry.
+
+    python bulk.py import term_marks.csv
+    python bulk.py export cohort.csv
+    python bulk.py migrate students.db
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from registry import StudentStore, MarksJournal, Student, format_record, validate_fields
+from storage import migrate
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MARKS = os.path.join(SCRIPT_DIR, "studentMarks.txt")
+CHUNK_SIZE = 20000
+HEADER = ["id", "name", "m1", "m2", "m3", "exam"]
+
+
+def validate_chunk(first_line, lines):
+    """Parses and validates a block of CSV lines in a worker process."""
+    rows, errors = [], []
+    for n, p in enumerate(csv.reader(lines), first_line):
+        if not p:
+            continue
+        try:
+            rows.append(validate_fields(p))
+        except ValueError as e:
+            errors.append((n, str(e)))
+    return rows, errors
+
+
+def read_chunks(path, size):
+    """Yields (first line number, lines) blocks, skipping a count or column header."""
+    with open(path, "r", newline="") as f:
+        first = f.readline()
+        line_no = 2
+        head = first.strip().lower()
+        if not (head.isdigit() or head.replace(" ", "").startswith("id,")):
+            yield 1, [first]
+        while True:
+            block = list(islice(f, size))
+            if not block:
+                return
+            yield line_no, block
+            line_no += len(block)
+
+
+def load_registry(path):
+    store = StudentStore()
+    journal = MarksJournal(path)
+    journal.load(store)
+    return store, journal
+
+
+def cmd_import(args):
+    store, journal = load_registry(args.marks)
+    before = len(store)
+    rows, errors = [], []
+    start = time.perf_counter()
+
+    workers = args.workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # keep a bounded number of chunks in flight so huge files still stream
+        pending = []
+        chunks = read_chunks(args.source, args.chunk_size)
+        for chunk in chunks:
+            pending.append(pool.submit(validate_chunk, *chunk))
+            if len(pending) < 2 * workers:
+                continue
+            valid, errs = pending.pop(0).result()
+            rows.extend(valid)
+            errors.extend(errs)
+        for fut in pending:
+            valid, errs = fut.result()
+            rows.extend(valid)
+            errors.extend(errs)
+
+    elapsed = time.perf_counter() - start
+    total = len(rows) + len(errors)
+    for n, msg in errors[:args.show_errors]:
+        print(f"line {n}: {msg}", file=sys.stderr)
+    if len(errors) > args.show_errors:
+        print(f"... and {len(errors) - args.show_errors} more errors", file=sys.stderr)
+
+    print(f"{total} rows in {elapsed:.2f}s ({total / elapsed if elapsed else 0:,.0f} rows/sec): "
+          f"{len(rows)} valid, {len(errors)} rejected")
+    if args.check:
+        added, updated = _apply(store, rows)
+        print(f"Would add {added} and update {updated}. Check only, registry not changed.")
+        return 1 if errors else 0
+    if errors and not args.allow_errors:
+        print("Nothing saved. Fix the rows above or pass --allow-errors.", file=sys.stderr)
+        return 1
+
+    # merged under the registry lock, on top of whatever other portals have
+    # saved meanwhile, and written as one atomic snapshot
+    counts = []
+    journal.checkpoint(lambda: counts.extend(_apply(store, rows)))
+    journal.close()
+    added, updated = counts
+    print(f"{added} added, {updated} updated. Registry now holds {len(store)} students (was {before}).")
+    return 0
+
+
+def _apply(store, rows):
+    added = updated = 0
+    for row in rows:
+        if row[0] in store:
+            updated += 1
+        else:
+            added += 1
+        store.add(Student(*row))
+    return added, updated
+
+
+def cmd_export(args):
+    store, _ = load_registry(args.marks)
+    out = open(args.dest, "w", newline="") if args.dest != "-" else sys.stdout
+    start = time.perf_counter()
+    try:
+        if args.format == "csv":
+            w = csv.writer(out)
+            w.writerow(HEADER)
+            for s in store:
+                w.writerow([s.id, s.name, s.m1, s.m2, s.m3, s.exam])
+        else:
+            out.write(f"{len(store)}\n")
+            for s in store:
+                out.write(format_record(s) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - start
+    print(f"Exported {len(store)} rows in {elapsed:.2f}s "
+          f"({len(store) / elapsed if elapsed else 0:,.0f} rows/sec)", file=sys.stderr)
+    return 0
+
+
+def cmd_migrate(args):
+    start = time.perf_counter()
+    count = migrate(args.marks, args.db)
+    print(f"Copied {count} students into {args.db} in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import/export for the Yale student registry.")
+    parser.add_argument("--marks", default=DEFAULT_MARKS, help="registry file (default: studentMarks.txt)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    imp = sub.add_parser("import", help="validate and merge a CSV or marks file into the registry")
+    imp.add_argument("source")
+    imp.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    imp.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    imp.add_argument("--check", action="store_true", help="validate only, do not save")
+    imp.add_argument("--allow-errors", action="store_true", help="save the valid rows even if some are rejected")
+    imp.add_argument("--show-errors", type=int, default=20)
+    imp.set_defaults(func=cmd_import)
+
+    exp = sub.add_parser("export", help="write the registry out as CSV or marks format")
+    exp.add_argument("dest", help="output file, or - for stdout")
+    exp.add_argument("--format", choices=("csv", "marks"), default="csv")
+    exp.set_defaults(func=cmd_export)
+
+    mig = sub.add_parser("migrate", help="copy the text registry into an SQLite database")
+    mig.add_argument("db")
+    mig.set_defaults(func=cmd_migrate)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+"""Small query language for the registry search box.
+
+    grade:A exam>=80 cw<30 sort:-pct      A grades with a strong exam but weak coursework, best first
+    name:curry pct<50                     anyone called Curry who is failing to reach 50%
+    john                                  plain words still search names and IDs
+
+Fields are id, name, m1, m2, m3, cw, exam, total, pct and grade. Numeric fields
+take = : != < <= > >=, text fields use : for "contains" and = for "equals",
+grade:A,B matches either grade, grade!=A,B neither, grade>=C means C or better,
+and sort:field,-field orders the results.
+"""
+import re
+
+from registry import calc_stats, GRADE_BANDS
+
+TEXT_FIELDS = ("id", "name")
+NUMERIC_FIELDS = ("m1", "m2", "m3", "cw", "exam", "total", "pct")
+FIELDS = TEXT_FIELDS + NUMERIC_FIELDS + ("grade",)
+
+TOKEN = re.compile(r'(?P<field>[A-Za-z0-9]+)(?P<op>>=|<=|!=|=|:|>|<)(?P<value>"[^"]*"|\S*)'
+                   r'|"(?P<phrase>[^"]*)"|(?P<word>\S+)')
+
+
+class QueryError(ValueError):
+    pass
+
+
+def field_value(s, field):
+    """Reads a stored or derived field from a record."""
+    if field in ("id", "name", "m1", "m2", "m3", "exam"):
+        return s[field]
+    cw, exam, pct, g = calc_stats(s)
+    if field == "cw":
+        return cw
+    if field == "total":
+        return cw + exam
+    if field == "pct":
+        return pct
+    return g
+
+
+def grade_range(g):
+    """The pct range (lo, hi) a grade covers, hi exclusive; None means unbounded."""
+    bounds = [c for c, _ in GRADE_BANDS]
+    grades = [name for _, name in GRADE_BANDS]
+    if g == 'F':
+        return None, bounds[-1]
+    i = grades.index(g)
+    return bounds[i], (bounds[i - 1] if i else None)
+
+
+class Query:
+    """A parsed query: free text plus (field, op, value) filters and sort keys."""
+
+    def __init__(self, text="", filters=(), sort=()):
+        self.text = text
+        self.filters = list(filters)
+        self.sort = list(sort)
+
+    @property
+    def is_plain(self):
+        return not self.filters and not self.sort
+
+    def matches(self, s):
+        if self.text and self.text.lower() not in f"{s['name'].lower()}\0{s['id'].lower()}":
+            return False
+        for field, op, value in self.filters:
+            v = field_value(s, field)
+            if field in TEXT_FIELDS:
+                v = v.lower()
+            if op == "in":
+                if v not in value:
+                    return False
+            elif op == "not in":
+                if v in value:
+                    return False
+            elif op == "contains":
+                if value not in v:
+                    return False
+            elif not _compare(v, op, value):
+                return False
+        return True
+
+    def ranges(self):
+        """Yields (field, lo, lo_inclusive, hi, hi_inclusive) for filters an index can answer."""
+        for field, op, value in self.filters:
+            if field in NUMERIC_FIELDS:
+                if op == "=":
+                    yield field, value, True, value, True
+                elif op in (">", ">="):
+                    yield field, value, op == ">=", None, False
+                elif op in ("<", "<="):
+                    yield field, None, False, value, op == "<="
+            elif field == "grade" and op == "in" and len(value) == 1:
+                lo, hi = grade_range(next(iter(value)))
+                yield "pct", lo, True, hi, False
+
+
+def _compare(v, op, value):
+    if op == "=":
+        return v == value
+    if op == "!=":
+        return v != value
+    if op == "<":
+        return v < value
+    if op == "<=":
+        return v <= value
+    if op == ">":
+        return v > value
+    return v >= value
+
+
+def _grade_filter(op, g):
+    """A grade comparison (better grades being higher) as a pct filter; None if it matches everyone."""
+    lo, hi = grade_range(g)
+    bound = hi if op in (">", "<=") else lo
+    if bound is None:
+        # above A or below F matches nobody; up to A or down to F matches everybody
+        return None if op in (">=", "<=") else ("grade", "in", set())
+    return "pct", ">=" if op in (">", ">=") else "<", bound
+
+
+def _number(field, raw):
+    try:
+        return float(raw) if "." in raw else int(raw)
+    except ValueError:
+        raise QueryError(f"{field} needs a number, not '{raw}'")
+
+
+def parse_query(text):
+    """Compiles search box text into a Query, raising QueryError if it is malformed."""
+    words, filters, sort = [], [], []
+    for m in TOKEN.finditer(text):
+        field = (m.group("field") or "").lower()
+        if m.group("phrase") is not None:
+            words.append(m.group("phrase"))
+            continue
+        if m.group("word") is not None or (field not in FIELDS and field != "sort"):
+            # not one of ours, e.g. a name that happens to contain a colon
+            words.append(m.group(0))
+            continue
+
+        op, raw = m.group("op"), m.group("value").strip('"')
+        if not raw:
+            raise QueryError(f"'{field}{op}' needs a value")
+        if field == "sort":
+            for key in raw.split(","):
+                name = key.lstrip("-+").lower()
+                if name not in FIELDS:
+                    raise QueryError(f"can't sort by '{name}'")
+                sort.append((name, key.startswith("-")))
+        elif field == "grade":
+            grades = {g.upper() for g in raw.split(",")}
+            if not grades <= {g for _, g in GRADE_BANDS} | {'F'}:
+                raise QueryError(f"unknown grade in '{raw}'")
+            if op in (":", "="):
+                filters.append(("grade", "in", grades))
+            elif op == "!=":
+                filters.append(("grade", "not in", grades))
+            elif len(grades) > 1:
+                raise QueryError(f"'grade{op}' takes one grade, not '{raw}'")
+            else:
+                term = _grade_filter(op, grades.pop())
+                if term is not None:
+                    filters.append(term)
+        elif field in TEXT_FIELDS:
+            if op == ":":
+                filters.append((field, "contains", raw.lower()))
+            elif op in ("=", "!="):
+                filters.append((field, op, raw.lower()))
+            else:
+                raise QueryError(f"{field} can only be matched with : = or !=")
+        else:
+            filters.append((field, "=" if op == ":" else op, _number(field, raw)))
+    return Query(" ".join(words), filters, sort)
+
+
+def run(store, query):
+    """Evaluates a query against a StudentStore using its column indexes.
+
+    The narrowest indexed range (or the trigram search for free text) picks the
+    candidates and only those are checked against the remaining filters. With no
+    filters at all, a sort on an indexed column just walks that index.
+    """
+    if query.is_plain:
+        return store.search(query.text)
+
+    narrowest = None
+    for field, lo, lo_inc, hi, hi_inc in query.ranges():
+        idx = store.column_index(field)
+        start, end = idx.span(lo, lo_inc, hi, hi_inc)
+        size = idx.count_in(start, end)
+        if narrowest is None or size < narrowest[3]:
+            narrowest = (idx, start, end, size)
+    best = list(narrowest[0].entries(narrowest[1], narrowest[2])) if narrowest else None
+
+    if query.text and (best is None or len(best) > 64):
+        cands = store.search(query.text)
+        if best is not None and len(cands) > len(best):
+            cands = [store.get(sid) for _, _, sid in best]
+    elif best is not None:
+        cands = [store.get(sid) for _, _, sid in best]
+    elif query.sort and len(query.sort) == 1 and query.sort[0][0] in NUMERIC_FIELDS:
+        field, desc = query.sort[0]
+        order = store.column_index(field).entries(descending=desc)
+        return [s for s in (store.get(sid) for _, _, sid in order) if query.matches(s)]
+    else:
+        cands = list(store)
+
+    hits = [s for s in cands if query.matches(s)]
+    if query.sort:
+        sort_records(hits, query.sort, store)
+    elif best is not None:
+        hits.sort(key=lambda s: store.position(s['id']))
+    return hits
+
+
+def sort_records(recs, keys, store=None):
+    """Sorts in place by several (field, descending) keys, enrolment order breaking ties."""
+    if store is not None:
+        recs.sort(key=lambda s: store.position(s['id']))
+    for field, desc in reversed(keys):
+        if field in TEXT_FIELDS:
+            recs.sort(key=lambda s: field_value(s, field).lower(), reverse=desc)
+        else:
+            recs.sort(key=lambda s: field_value(s, field), reverse=desc)
@@ -1,7 +1,18 @@
+import os
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+import portfolio  # noqa: F401 (the shared modules below live one folder up)
+from startup import PROFILE, run_in_background
+
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
-import os
-from PIL import Image, ImageTk
+import argparse
+import sqlite3
+from registry import Student, calc_stats, validate_fields
+from storage import TextBackend, SQLiteBackend
+from query import parse_query, QueryError
+
+PROFILE.mark("imports")
 
 # --- yale brand ---
 YALE_BLUE = "#00356b"
@@ -10,19 +21,67 @@ YALE_GOLD = "#bd9319"
 LIGHT_GRAY = "#f0f0f0"
 ACADEMIC_FONT = "Times New Roman"
 
-
-SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+# --- registry table ---
+PAGE_SIZE = 100
+SEARCH_DELAY_MS = 250
+JOURNAL_SYNC_MS = 2000
+REGISTRY_POLL_MS = 2000
+DATA_VIEWS = ("registry", "analytics")  # screens a poll re-queries when another portal saves
+RANK_LIST_SIZE = 3
+# clicking a heading sorts by this field; a leading "-" means best/highest first
+HEADING_SORT = {"ID": "id", "Full Name": "name", "CW Total": "-cw", "Exam Score": "-exam",
+                "Grade": "-pct", "Rank": "-pct"}
+
+# --- image cache ---
+BG_SIZE = (830, 750)
+_photo_cache = {}
+
+
+def load_background(path, size, img=None):
+    """Returns a PhotoImage of path scaled to size, decoding and resizing it only once.
+
+    img can be the result of scaled_image, e.g. prepared on another thread.
+    """
+    from PIL import ImageTk  # PIL is only needed once the picture is shown
+    key = (path, size)
+    if key not in _photo_cache:
+        _photo_cache[key] = ImageTk.PhotoImage(img or scaled_image(path, size))
+    return _photo_cache[key]
+
+
+def scaled_image(path, size):
+    """Loads a resized copy of an image, reusing a pre-scaled file on disk while it is newer than the source."""
+    from PIL import Image
+    cache_path = f"{os.path.splitext(path)[0]}.{size[0]}x{size[1]}.cache.png"
+    try:
+        if os.path.getmtime(cache_path) >= os.path.getmtime(path):
+            img = Image.open(cache_path)
+            img.load()
+            return img
+    except OSError:
+        pass
+    img = Image.open(path).resize(size, Image.Resampling.LANCZOS)
+    try:
+        img.save(cache_path)
+    except OSError:
+        pass
+    return img
 
 class YalePortal:
-    def __init__(self, root):
+    def __init__(self, root, backend=None):
         self.root = root
         self.root.title("Yale University | Student Dashboard")
         self.root.geometry("1150x750")
         self.root.resizable(False, False)
         
-        self.students = []
+        self._search_job = None
         self.file_path = os.path.join(SCRIPT_DIR, "studentMarks.txt")
-        self.load_data()
+        # the text file by default, or e.g. SQLiteBackend("students.db")
+        self.backend = backend or TextBackend(self.file_path)
+        self._sync_job = None
+        self.ready = False
+        self._enter_when_ready = False
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
         # main layout
         self.main_frame = tk.Frame(self.root, bg=WHITE)
@@ -33,51 +92,77 @@ class YalePortal:
         
         self.content_area = tk.Frame(self.main_frame, bg=WHITE)
         self.content_area.pack(side="right", fill="both", expand=True)
-        
+        self.content_area.config(bg="#f4f4f4")
+        bg_path = os.path.join(SCRIPT_DIR, "yale.png")
+        run_in_background(self.root, lambda: scaled_image(bg_path, BG_SIZE),
+                          lambda img: self.set_background(bg_path, img), name="yale.png")
+
+        # screens are built once and swapped in and out
+        self.views = {}
+        self.current_view = None
+
         #login screen
         self.show_login_screen()
 
+        # the login screen is up; read the registry meanwhile
+        if isinstance(self.backend, TextBackend):
+            run_in_background(self.root, self.load_data, self.data_ready, name="registry")
+        else:
+            # sqlite3 connections belong to the thread that opened them
+            self.load_data()
+            self.data_ready()
+
+    def data_ready(self, _=None):
+        self.ready = True
+        # pick up edits made by other portals sharing the file
+        self.root.after(REGISTRY_POLL_MS, self.poll_registry)
+        if self._enter_when_ready:
+            self.enter_portal()
+
+    def enter_portal(self):
+        for b in self.menu_btns: b.config(state="normal")
+        self.view_all()
+
     def load_data(self):
-        """Loads and parses the studentMarks.txt file."""
-        if not os.path.exists(self.file_path):
+        """Loads and parses the studentMarks.txt file (or opens the chosen backend)."""
+        if isinstance(self.backend, TextBackend) and not os.path.exists(self.file_path):
             with open(self.file_path, "w") as f:
                 f.write("10\n1345,John Curry,8,15,7,45\n2345,Sam Sturtivant,14,15,14,77\n9876,Lee Scott,17,11,16,99\n3724,Matt Thompson,19,11,15,81\n1212,Ron Herrema,14,17,18,66\n8439,Jake Hobbs,10,11,10,43\n2344,Jo Hyde,6,15,10,55\n9384,Gareth Southgate,5,6,8,33\n8327,Alan Shearer,20,20,20,100\n2983,Les Ferdinand,15,17,18,92")
         
-        self.students = []
         try:
-            with open(self.file_path, "r") as f:
-                lines = f.readlines()
-                for line in lines[1:]:
-                    p = line.strip().split(',')
-                    if len(p) == 6:
-                        self.students.append({
-                            "id": p[0], "name": p[1], 
-                            "m1": int(p[2]), "m2": int(p[3]), 
-                            "m3": int(p[4]), "exam": int(p[5])
-                        })
+            # for the text file: snapshot plus any edits made since the last compaction
+            self.backend.load()
         except Exception as e:
             print(f"Error loading file: {e}")
 
-    def save_to_file(self):
-        """Syncs the internal list back to the text file."""
-        with open(self.file_path, "w") as f:
-            f.write(f"{len(self.students)}\n")
-            for s in self.students:
-                f.write(f"{s['id']},{s['name']},{s['m1']},{s['m2']},{s['m3']},{s['exam']}\n")
+    def schedule_sync(self):
+        """Batches the fsync of recent edits instead of doing one per edit."""
+        if self._sync_job is None:
+            self._sync_job = self.root.after(JOURNAL_SYNC_MS, self.sync_journal)
+
+    def sync_journal(self):
+        self._sync_job = None
+        self.backend.sync()
+
+    def poll_registry(self):
+        """Applies only the new edits other instances have journaled, then re-queries the open data view.
+
+        Forms are left alone so a half-typed enrolment survives another portal saving.
+        """
+        try:
+            if self.backend.refresh() and self.current_view in DATA_VIEWS:
+                self.show_view(self.current_view)
+        except (OSError, sqlite3.Error) as e:
+            print(f"Error refreshing registry: {e}")
+        self.root.after(REGISTRY_POLL_MS, self.poll_registry)
+
+    def on_close(self):
+        self.backend.close()
+        self.root.destroy()
 
     def calc_stats(self, s):
         """Calculates marks and returns (CW_Total, Exam, Pct, Grade)."""
-        cw = s['m1'] + s['m2'] + s['m3']
-        total = cw + s['exam']
-        # percentage
-        pct = (total / 160) * 100
-        # grade based on percentage
-        if pct >= 70: g = 'A'
-        elif pct >= 60: g = 'B'
-        elif pct >= 50: g = 'C'
-        elif pct >= 40: g = 'D'
-        else: g = 'F'
-        return cw, s['exam'], round(pct, 2), g
+        return calc_stats(s)
 
     def create_sidebar(self):
         sidebar = tk.Frame(self.main_frame, bg=YALE_BLUE, width=320)
@@ -111,26 +196,51 @@ class YalePortal:
 
         tk.Label(sidebar, text="Lux et Veritas", font=(ACADEMIC_FONT, 12, "italic"), fg=WHITE, bg=YALE_BLUE).pack(side="bottom", pady=30)
 
-    def set_background(self):
+    def set_background(self, bg_path, img=None):
         """Properly places the background image so it covers the white area."""
         try:
-            bg_path = os.path.join(SCRIPT_DIR, "yale.png")
-            img = Image.open(bg_path).resize((830, 750), Image.Resampling.LANCZOS)
-            self.bg_photo = ImageTk.PhotoImage(img)
+            self.bg_photo = load_background(bg_path, BG_SIZE, img)
             
-            # image label
+            # image label, kept behind whichever screen is already showing
             bg_lbl = tk.Label(self.content_area, image=self.bg_photo)
             bg_lbl.place(x=0, y=0, relwidth=1, relheight=1)
+            bg_lbl.lower()
         except Exception as e:
             print(f"Background Error: {e}")
-            self.content_area.config(bg="#f4f4f4")
+
+    # --- VIEW MANAGER ---
+
+    def show_view(self, name):
+        """Shows a screen, building it on first use and afterwards only refreshing its data."""
+        if self.current_view and self.current_view != name:
+            overlay = self.views[self.current_view][0]
+            if overlay.winfo_manager() == "pack":
+                overlay.pack_forget()
+            else:
+                overlay.place_forget()
+
+        if name not in self.views:
+            self.views[name] = getattr(self, f"build_{name}")()
+        overlay, show, refresh = self.views[name]
+        if self.current_view != name:
+            show()
+        refresh()
+        self.current_view = name
 
     def show_login_screen(self):
-        self.clear_content()
-        self.set_background()
-        
+        self.show_view("login")
+
+    def view_all(self):
+        self.show_view("registry")
+
+    def view_analytics(self):
+        self.show_view("analytics")
+
+    def add_student_ui(self):
+        self.show_view("enroll")
+
+    def build_login(self):
         login_box = tk.Frame(self.content_area, bg=WHITE, padx=50, pady=50, highlightthickness=2, highlightbackground=YALE_BLUE)
-        login_box.place(relx=0.5, rely=0.5, anchor="center")
 
         tk.Label(login_box, text="STUDENT DASHBOARD", font=(ACADEMIC_FONT, 24, "bold"), bg=WHITE, fg=YALE_BLUE).pack(pady=(0, 5))
         tk.Label(login_box, text="Authorized Personnel Only", font=("Helvetica", 9), bg=WHITE, fg="gray").pack(pady=(0, 30))
@@ -144,24 +254,23 @@ class YalePortal:
 
         def attempt_login():
             if pass_e.get() == "1701":
-                for b in self.menu_btns: b.config(state="normal")
-                self.view_all()
+                pass_e.delete(0, tk.END)
+                if self.ready:
+                    self.enter_portal()
+                else:
+                    # still reading the registry; go straight in once it is loaded
+                    self._enter_when_ready = True
             else:
                 messagebox.showerror("Denied", "The security pin is incorrect.")
 
         tk.Button(login_box, text="VERIFY & ENTER", bg=YALE_BLUE, fg=WHITE, font=("Helvetica", 10, "bold"), 
                   width=25, pady=10, cursor="hand2", command=attempt_login).pack(pady=30)
 
-    def clear_content(self):
-        """Removes existing widgets but keeps the container ready."""
-        for widget in self.content_area.winfo_children():
-            widget.destroy()
+        show = lambda: login_box.place(relx=0.5, rely=0.5, anchor="center")
+        return login_box, show, pass_e.focus_set
 
-    def view_all(self):
-        self.clear_content()
-        self.set_background()
+    def build_registry(self):
         overlay = tk.Frame(self.content_area, bg=WHITE, padx=30, pady=30, highlightthickness=1, highlightbackground=LIGHT_GRAY)
-        overlay.pack(padx=40, pady=40, fill="both", expand=True)
 
         tk.Label(overlay, text="STUDENT REGISTRY", font=(ACADEMIC_FONT, 24, "bold"), bg=WHITE, fg=YALE_BLUE).pack()
         
@@ -170,52 +279,155 @@ class YalePortal:
         tk.Label(search_frame, text="Quick Search:", bg=WHITE, font=("Helvetica", 10, "italic")).pack(side="left")
         search_var = tk.StringVar()
         tk.Entry(search_frame, textvariable=search_var, width=50).pack(side="left", padx=10)
+        tk.Label(search_frame, text="e.g. grade:A exam>=80 sort:-pct", bg=WHITE, fg="gray",
+                 font=("Helvetica", 8, "italic")).pack(side="left")
 
-        cols = ("ID", "Full Name", "CW Total", "Exam Score", "Grade")
+        cols = ("ID", "Full Name", "CW Total", "Exam Score", "Grade", "Rank")
         tree = ttk.Treeview(overlay, columns=cols, show="headings", height=15)
-        for c in cols: tree.heading(c, text=c)
+        for c in cols: tree.heading(c, text=c, command=lambda c=c: sort_by(c))
+
+        # pager
+        pager = tk.Frame(overlay, bg=WHITE)
+        pager.pack(side="bottom", fill="x", pady=(10, 0))
+        prev_btn = tk.Button(pager, text="< Prev", bd=0, cursor="hand2", command=lambda: turn_page(-1))
+        prev_btn.pack(side="left")
+        next_btn = tk.Button(pager, text="Next >", bd=0, cursor="hand2", command=lambda: turn_page(1))
+        next_btn.pack(side="right")
+        page_lbl = tk.Label(pager, bg=WHITE, font=("Helvetica", 9), fg="gray")
+        page_lbl.pack()
         tree.pack(fill="both", expand=True)
 
-        def update_table(*args):
-            tree.delete(*tree.get_children())
-            q = search_var.get().lower()
-            for s in self.students:
+        # only the current page of results is ever in the tree
+        results = []
+        page = [0]
+        shown = {}
+        seen = [None]
+        heading_sort = [None]
+
+        def render_page():
+            last = max(0, (len(results) - 1) // PAGE_SIZE)
+            page[0] = min(page[0], last)
+            start = page[0] * PAGE_SIZE
+            visible = results[start:start + PAGE_SIZE]
+            ranks = self.backend.ranks([s['id'] for s in visible])
+            wanted = {}
+            for s in visible:
                 cw, ex, pct, g = self.calc_stats(s)
-                if q in s['name'].lower() or q in s['id']:
-                    tree.insert("", "end", values=(s['id'], s['name'], cw, ex, g))
-        
-        search_var.trace("w", update_table)
-        update_table()
-
-    def view_analytics(self):
-        self.clear_content()
-        self.set_background()
+                wanted[s['id']] = (s['id'], s['name'], cw, ex, g, ranks[s['id']])
+
+            # diff against what is already on screen instead of rebuilding
+            stale = [iid for iid in shown if iid not in wanted]
+            if stale:
+                tree.delete(*stale)
+                for iid in stale: del shown[iid]
+            for idx, (iid, vals) in enumerate(wanted.items()):
+                if iid not in shown:
+                    tree.insert("", idx, iid=iid, values=vals)
+                else:
+                    if shown[iid] != vals:
+                        tree.item(iid, values=vals)
+                    if tree.index(iid) != idx:
+                        tree.move(iid, "", idx)
+                shown[iid] = vals
+
+            first_row = start + 1 if visible else 0
+            page_lbl.config(text=f"Showing {first_row}-{start + len(visible)} of {len(results)} students", fg="gray")
+            prev_btn.config(state="normal" if page[0] > 0 else "disabled")
+            next_btn.config(state="normal" if page[0] < last else "disabled")
+
+        def turn_page(step):
+            page[0] += step
+            render_page()
+
+        def update_table(keep_page=False):
+            self._search_job = None
+            seen[0] = self.backend.version
+            try:
+                q = parse_query(search_var.get())
+            except QueryError as e:
+                page_lbl.config(text=f"Search not understood: {e}", fg="red")
+                return
+            if heading_sort[0]:
+                q.sort = [heading_sort[0]]
+            results[:] = self.backend.query(q)
+            if not keep_page:
+                page[0] = 0
+            render_page()
+
+        def sort_by(col):
+            # first click uses the column's natural order, the next one flips it
+            key = HEADING_SORT[col]
+            field, desc = key.lstrip("-"), key.startswith("-")
+            if heading_sort[0] == (field, desc):
+                desc = not desc
+            heading_sort[0] = (field, desc)
+            update_table()
+
+        def schedule_update(*args):
+            # wait for a pause in typing before searching
+            if self._search_job:
+                self.root.after_cancel(self._search_job)
+            self._search_job = self.root.after(SEARCH_DELAY_MS, update_table)
+
+        def refresh():
+            # coming back to the dashboard only re-queries if the registry changed
+            if seen[0] != self.backend.version:
+                update_table(keep_page=True)
+
+        search_var.trace("w", schedule_update)
+
+        show = lambda: overlay.pack(padx=40, pady=40, fill="both", expand=True)
+        return overlay, show, refresh
+
+    def build_analytics(self):
         overlay = tk.Frame(self.content_area, bg=WHITE, padx=40, pady=40)
-        overlay.place(relx=0.5, rely=0.5, anchor="center")
-
-        best = max(self.students, key=lambda s: self.calc_stats(s)[2])
-        worst = min(self.students, key=lambda s: self.calc_stats(s)[2])
-        avg = sum(self.calc_stats(s)[2] for s in self.students) / len(self.students)
 
         tk.Label(overlay, text="ACADEMIC PERFORMANCE SUMMARY", font=(ACADEMIC_FONT, 24, "bold"), bg=WHITE, fg=YALE_BLUE).pack(pady=20)
-        
-        stats = [
-            ("Highest Performing Student", f"{best['name']} ({self.calc_stats(best)[2]}%)"),
-            ("Lowest Performing Student", f"{worst['name']} ({self.calc_stats(worst)[2]}%)"),
-            ("Overall Class Average", f"{avg:.2f}%")
-        ]
 
-        for title, val in stats:
-            f = tk.Frame(overlay, bg=LIGHT_GRAY, pady=15, padx=25)
-            f.pack(fill="x", pady=8)
+        titles = ["Highest Performing Student", "Lowest Performing Student", "Overall Class Average",
+                  "Median / Upper Quartile", "Grade Distribution", "Grade Band Reaches",
+                  f"Top {RANK_LIST_SIZE} Students", f"Bottom {RANK_LIST_SIZE} Students"]
+        value_lbls = []
+        for title in titles:
+            f = tk.Frame(overlay, bg=LIGHT_GRAY, pady=10, padx=25)
+            f.pack(fill="x", pady=5)
             tk.Label(f, text=title, font=("Helvetica", 11, "bold"), bg=LIGHT_GRAY).pack(side="left")
-            tk.Label(f, text=val, font=(ACADEMIC_FONT, 13), bg=LIGHT_GRAY, fg=YALE_BLUE).pack(side="right")
-
-    def add_student_ui(self):
-        self.clear_content()
-        self.set_background()
+            lbl = tk.Label(f, font=(ACADEMIC_FONT, 13), bg=LIGHT_GRAY, fg=YALE_BLUE, justify="right")
+            lbl.pack(side="right")
+            value_lbls.append(lbl)
+
+        seen = [None]
+
+        def refresh():
+            if seen[0] == self.backend.version:
+                return
+            seen[0] = self.backend.version
+            if not len(self.backend):
+                for lbl in value_lbls: lbl.config(text="No records")
+                return
+
+            # the backend keeps these current or answers them from indexes, so nothing is rescanned here
+            reg = self.backend
+            best_pct, best = reg.highest()
+            worst_pct, worst = reg.lowest()
+            vals = [
+                f"{best['name']} ({best_pct}%)",
+                f"{worst['name']} ({worst_pct}%)",
+                f"{reg.average():.2f}%",
+                f"{reg.percentile(50)}% / {reg.percentile(75)}%",
+                "   ".join(f"{g}: {n}" for g, n in reg.grade_counts().items()),
+                "   ".join(f"{g}: top {share}%" for g, share in reg.band_cutoffs().items() if g != 'F'),
+                "\n".join(f"{i}. {s['name']} ({pct}%)" for i, (pct, s) in enumerate(reg.top_k(RANK_LIST_SIZE), 1)),
+                "\n".join(f"{s['name']} ({pct}%)" for pct, s in reg.bottom_k(RANK_LIST_SIZE))
+            ]
+            for lbl, val in zip(value_lbls, vals):
+                lbl.config(text=val)
+
+        show = lambda: overlay.place(relx=0.5, rely=0.5, anchor="center")
+        return overlay, show, refresh
+
+    def build_enroll(self):
         overlay = tk.Frame(self.content_area, bg=WHITE, padx=40, pady=40)
-        overlay.place(relx=0.5, rely=0.5, anchor="center")
 
         tk.Label(overlay, text="ENROLL NEW STUDENT", font=(ACADEMIC_FONT, 22, "bold"), bg=WHITE, fg=YALE_BLUE).pack(pady=20)
         
@@ -230,34 +442,52 @@ class YalePortal:
             ents[f] = e
 
         def save():
+            # the same checks as a bulk import: an ID is required (it names the row in the
+            # table) and commas would split the journal line
             try:
-                new_data = {
-                    "id": ents["ID Number"].get(), "name": ents["Full Name"].get(), 
-                    "m1": int(ents["CW 1 (0-20)"].get()), "m2": int(ents["CW 2 (0-20)"].get()), 
-                    "m3": int(ents["CW 3 (0-20)"].get()), "exam": int(ents["Exam (0-100)"].get())
-                }
-                self.students.append(new_data)
-                self.save_to_file()
-                messagebox.showinfo("Success", "Student archive updated.")
-                self.view_all()
-            except ValueError:
-                messagebox.showerror("Error", "Please enter valid numeric scores.")
+                new_data = Student(*validate_fields([ents[f].get() for f in fields]))
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
+                return
+            self.backend.refresh()
+            if new_data["id"] in self.backend:
+                messagebox.showerror("Error", f"A student with ID {new_data['id']} already exists.")
+                return
+            self.backend.add(new_data)
+            self.schedule_sync()
+            messagebox.showinfo("Success", "Student archive updated.")
+            self.view_all()
 
         tk.Button(overlay, text="ARCHIVE RECORD", bg=YALE_BLUE, fg=WHITE, padx=30, pady=10, font=("Helvetica", 10, "bold"), command=save).pack(pady=25)
 
+        def refresh():
+            # a fresh blank form each time the screen is opened
+            for e in ents.values(): e.delete(0, tk.END)
+            ents["ID Number"].focus_set()
+
+        show = lambda: overlay.place(relx=0.5, rely=0.5, anchor="center")
+        return overlay, show, refresh
+
     def manage_records_ui(self):
         name = simpledialog.askstring("Database Management", "Enter the Full Name of the student record to remove:")
         if name:
-            filtered = [s for s in self.students if s['name'].lower() != name.lower()]
-            if len(filtered) < len(self.students):
-                self.students = filtered
-                self.save_to_file()
+            if self.backend.remove_by_name(name):
+                self.schedule_sync()
                 self.view_all()
                 messagebox.showinfo("Action Complete", f"Records for {name} have been purged.")
             else:
                 messagebox.showwarning("Not Found", "No matching student record found.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Yale registrar's student dashboard.")
+    parser.add_argument("--db", help="use this SQLite database instead of studentMarks.txt")
+    parser.add_argument("--profile-startup", action="store_true", help="print start-up timings")
+    args = parser.parse_args()
+    PROFILE.enabled = args.profile_startup
+
     root = tk.Tk()
-    app = YalePortal(root)
+    PROFILE.mark("tk root")
+    app = YalePortal(root, SQLiteBackend(args.db) if args.db else None)
+    PROFILE.mark("app init")
+    PROFILE.watch(root)
     root.mainloop()
\ No newline at end of file
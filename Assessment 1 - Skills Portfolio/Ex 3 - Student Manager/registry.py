@@ -0,0 +1,874 @@
+"""Tk-free student registry used by the Yale portal."""
+import bisect
+import math
+import os
+import threading
+from contextlib import contextmanager
+from itertools import islice
+
+try:
+    import fcntl
+except ImportError:
+    import msvcrt
+    fcntl = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# --- grading ---
+MAX_TOTAL = 160
+GRADE_BANDS = ((70, 'A'), (60, 'B'), (50, 'C'), (40, 'D'))
+LIMITS = (("m1", 20), ("m2", 20), ("m3", 20), ("exam", 100))  # highest mark for each
+
+# numeric columns the search box filters and sorts on, and the values each can take
+COLUMN_DOMAINS = {"m1": range(21), "m2": range(21), "m3": range(21), "cw": range(61),
+                  "exam": range(101), "total": range(MAX_TOTAL + 1)}
+
+# --- journal ---
+JOURNAL_SUFFIX = ".journal"
+FSYNC_EVERY = 50
+COMPACT_AFTER = 1000
+
+
+def grade_for(pct):
+    for cutoff, g in GRADE_BANDS:
+        if pct >= cutoff:
+            return g
+    return 'F'
+
+
+def calc_stats(s):
+    """Calculates marks and returns (CW_Total, Exam, Pct, Grade)."""
+    cw = s.m1 + s.m2 + s.m3
+    pct = ((cw + s.exam) / MAX_TOTAL) * 100
+    return cw, s.exam, round(pct, 2), grade_for(pct)
+
+
+# every valid total is 0-160, so percentages and grades can be looked up
+_PCT = [round((t / MAX_TOTAL) * 100, 2) for t in range(MAX_TOTAL + 1)]
+_GRADE = [grade_for((t / MAX_TOTAL) * 100) for t in range(MAX_TOTAL + 1)]
+
+
+def column_value(rec, field):
+    if field == "cw":
+        return rec.m1 + rec.m2 + rec.m3
+    if field == "total":
+        return rec.m1 + rec.m2 + rec.m3 + rec.exam
+    return getattr(rec, field)
+
+
+def grade_cohort(records):
+    """Computes CW totals, percentages and grades for every record in one pass.
+
+    Returns three lists aligned with records. Uses NumPy when it is installed and
+    plain lookup tables otherwise; both give exactly what calc_stats would.
+    """
+    n = len(records)
+    if np is not None and n:
+        marks = np.fromiter((v for s in records for v in (s.m1, s.m2, s.m3, s.exam)),
+                            dtype=np.int64, count=4 * n).reshape(n, 4)
+        cw = marks[:, :3].sum(axis=1)
+        totals = cw + marks[:, 3]
+        if totals.min() >= 0 and totals.max() <= MAX_TOTAL:
+            pct = np.asarray(_PCT)[totals]
+            grades = np.asarray(_GRADE)[totals]
+            return cw.tolist(), pct.tolist(), grades.tolist()
+
+    cw = [s.m1 + s.m2 + s.m3 for s in records]
+    pct, grades = [], []
+    for c, s in zip(cw, records):
+        t = c + s.exam
+        if 0 <= t <= MAX_TOTAL:
+            pct.append(_PCT[t])
+            grades.append(_GRADE[t])
+        else:
+            _, _, p, g = calc_stats(s)
+            pct.append(p)
+            grades.append(g)
+    return cw, pct, grades
+
+
+class ValueIndex:
+    """Records grouped by a column that only takes a few distinct values.
+
+    Each value has a bucket of (seq, id) pairs in enrolment order, and a Fenwick
+    tree over the bucket sizes answers "how many below this value" and "which
+    record is k-th" in O(log V) for V distinct values. Adding or removing a
+    record updates log V tree cells plus its bucket, a sorted list of about N/V
+    pairs: a new enrolment appends in O(1), but an edit (which keeps its old
+    seq) or a removal shifts the bucket's tail, O(N/V). That is a memmove, quick
+    next to the rest of an edit, but with V = 21 for m1..m3 it does grow with
+    the cohort. The domain is given up front (every possible total, say); a
+    value outside it, e.g. from a hand-edited file, widens the domain the first
+    time it is seen.
+    """
+
+    def __init__(self, domain):
+        self.values = sorted(set(domain))
+        self.count = 0
+        self._buckets = [[] for _ in self.values]
+        self._reslot()
+
+    def _reslot(self):
+        self._slot = {v: i for i, v in enumerate(self.values)}
+        tree = [0] * (len(self.values) + 1)
+        for i, bucket in enumerate(self._buckets, 1):
+            tree[i] += len(bucket)
+            j = i + (i & -i)
+            if j < len(tree):
+                tree[j] += tree[i]
+        self._tree = tree
+
+    def _slot_of(self, value):
+        slot = self._slot.get(value)
+        if slot is None:
+            slot = bisect.bisect_left(self.values, value)
+            self.values.insert(slot, value)
+            self._buckets.insert(slot, [])
+            self._reslot()
+        return slot
+
+    def _bump(self, slot, delta):
+        tree = self._tree
+        i = slot + 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+        self.count += delta
+
+    def __len__(self):
+        return self.count
+
+    def add(self, value, seq, sid):
+        slot = self._slot_of(value)
+        bucket = self._buckets[slot]
+        if not bucket or bucket[-1][0] < seq:
+            bucket.append((seq, sid))
+        else:
+            bisect.insort(bucket, (seq, sid))
+        self._bump(slot, 1)
+
+    def remove(self, value, seq, sid):
+        slot = self._slot[value]
+        bucket = self._buckets[slot]
+        del bucket[bisect.bisect_left(bucket, (seq,))]
+        self._bump(slot, -1)
+
+    def fill(self, entries):
+        """Adds (value, seq, id) entries given in enrolment order, rebuilding the tree once at the end."""
+        slots, buckets = self._slot, self._buckets
+        for value, seq, sid in entries:
+            slot = slots.get(value)
+            if slot is None:
+                slot = self._slot_of(value)
+                slots = self._slot
+            buckets[slot].append((seq, sid))
+            self.count += 1
+        self._reslot()
+
+    def below(self, slot):
+        """How many records sit in the slots before slot."""
+        tree = self._tree
+        n = 0
+        while slot > 0:
+            n += tree[slot]
+            slot -= slot & -slot
+        return n
+
+    def kth(self, k):
+        """(value, seq, id) of the k-th smallest record counting from 0, ties in enrolment order."""
+        if not 0 <= k < self.count:
+            raise IndexError("no such record")
+        tree = self._tree
+        slot, step = 0, 1 << len(tree).bit_length()
+        while step:
+            i = slot + step
+            if i < len(tree) and tree[i] <= k:
+                slot = i
+                k -= tree[i]
+            step >>= 1
+        seq, sid = self._buckets[slot][k]
+        return self.values[slot], seq, sid
+
+    def span(self, lo=None, lo_inc=True, hi=None, hi_inc=True):
+        """The slots [start, end) whose values are within the bounds; None means unbounded."""
+        v = self.values
+        start = 0 if lo is None else (bisect.bisect_left(v, lo) if lo_inc else bisect.bisect_right(v, lo))
+        end = len(v) if hi is None else (bisect.bisect_right(v, hi) if hi_inc else bisect.bisect_left(v, hi))
+        return start, max(start, end)
+
+    def count_in(self, start, end):
+        return self.below(end) - self.below(start)
+
+    def entries(self, start=0, end=None, descending=False):
+        """Yields (value, seq, id) for slots [start, end), lowest value first or highest first.
+
+        Records with the same value always come in enrolment order.
+        """
+        end = len(self.values) if end is None else end
+        for slot in (range(end - 1, start - 1, -1) if descending else range(start, end)):
+            value = self.values[slot]
+            for seq, sid in self._buckets[slot]:
+                yield value, seq, sid
+
+
+class CohortStats:
+    """Running aggregates over the cohort, kept current as records come and go.
+
+    Holds the count, an exact sum of percentages (in hundredths), grade band
+    counts and a ValueIndex over the percentages (a percentage can only be one
+    of the 161 _PCT values), which answers min/max, percentiles and class rank
+    in O(log V) time for those V = 161 values.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._centi_sum = 0
+        self.bands = {g: 0 for _, g in GRADE_BANDS}
+        self.bands['F'] = 0
+        self.by_pct = ValueIndex(_PCT)
+
+    def add(self, seq, rec):
+        _, _, pct, g = calc_stats(rec)
+        self.count += 1
+        self._centi_sum += round(pct * 100)
+        self.bands[g] += 1
+        self.by_pct.add(pct, seq, rec.id)
+
+    def remove(self, seq, rec):
+        _, _, pct, g = calc_stats(rec)
+        self.count -= 1
+        self._centi_sum -= round(pct * 100)
+        self.bands[g] -= 1
+        self.by_pct.remove(pct, seq, rec.id)
+
+    def fill(self, seqs, records):
+        """Counts records given in enrolment order into empty aggregates in one pass."""
+        _, pct, grades = grade_cohort(records)
+        self.count += len(records)
+        self._centi_sum += sum(round(p * 100) for p in pct)
+        for g in grades:
+            self.bands[g] += 1
+        self.by_pct.fill(zip(pct, seqs, (rec.id for rec in records)))
+
+    def average(self):
+        return self._centi_sum / self.count / 100 if self.count else 0.0
+
+    def lowest(self):
+        """(pct, id) of the lowest scorer, earliest enrolled on ties."""
+        pct, _, sid = self.by_pct.kth(0)
+        return pct, sid
+
+    def highest(self):
+        """(pct, id) of the highest scorer, earliest enrolled on ties."""
+        idx = self.by_pct
+        top = idx.kth(self.count - 1)[0]
+        start, _ = idx.span(top)
+        pct, _, sid = idx.kth(idx.below(start))
+        return pct, sid
+
+    def percentile(self, p):
+        """Nearest-rank percentage at percentile p (0-100)."""
+        k = max(1, math.ceil(p / 100 * self.count))
+        return self.by_pct.kth(k - 1)[0]
+
+    def rank_of(self, pct):
+        """Class rank for a percentage: 1 + the number of students strictly above it."""
+        return self.by_pct.count_in(*self.by_pct.span(pct, False)) + 1
+
+    def top(self, k):
+        """The k best (pct, id) pairs, best first and earliest enrolled first on ties."""
+        best = islice(self.by_pct.entries(descending=True), max(k, 0))
+        return [(pct, sid) for pct, _, sid in best]
+
+    def bottom(self, k):
+        """The k weakest (pct, id) pairs, weakest first."""
+        return [(pct, sid) for pct, _, sid in islice(self.by_pct.entries(), max(k, 0))]
+
+    def band_cutoffs(self):
+        """For each grade, the share of the cohort (%) scoring at or above that grade's cutoff."""
+        if not self.count:
+            return {}
+        shares = {}
+        for cutoff, g in GRADE_BANDS:
+            at_or_above = self.by_pct.count_in(*self.by_pct.span(cutoff))
+            shares[g] = round(at_or_above / self.count * 100, 1)
+        shares['F'] = 100.0
+        return shares
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class StudentStore:
+    """In-memory student records with a hash index on ID and name indexes for search.
+
+    Records are kept in insertion order. Exact names map to their IDs so purging
+    by name is a dictionary lookup, and every trigram of "name + ID" maps to the
+    IDs containing it so substring search only has to check a few candidates.
+    The trigram index is built by the first search that needs it, so loading a
+    registry that is never searched does not pay for it.
+    """
+
+    def __init__(self, records=()):
+        self._by_id = {}
+        self._seq = {}
+        self._next_seq = 0
+        self._by_name = {}
+        self._grams = None  # trigram -> IDs, built on first search and kept current after
+        self._columns = {}  # field -> ValueIndex, built on first use and kept current after
+        self.version = 0
+        self.stats = CohortStats()
+        self.fill(records)
+
+    def clear(self):
+        """Drops every record, e.g. before a full reload."""
+        version = self.version
+        self.__init__()
+        self.version = version + 1
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __iter__(self):
+        return iter(list(self._by_id.values()))
+
+    def __contains__(self, sid):
+        return sid in self._by_id
+
+    def get(self, sid):
+        return self._by_id.get(sid)
+
+    @staticmethod
+    def _key(rec):
+        # NUL keeps trigrams from spanning the name and the ID
+        return f"{rec.name.lower()}\0{rec.id.lower()}"
+
+    def add(self, rec):
+        """Adds a record, replacing any existing record with the same ID."""
+        sid = rec.id
+        if sid in self._by_id:
+            self._unindex(self._by_id[sid])
+        else:
+            self._seq[sid] = self._next_seq
+            self._next_seq += 1
+        self._by_id[sid] = rec
+        self._index(rec)
+        self._changed()
+
+    def fill(self, records):
+        """Loads records into an empty store, building each index once at the end.
+
+        Gives the same store as add() per record (a repeated ID replaces the
+        earlier record and keeps its place) in a fraction of the time.
+        """
+        if self._by_id:
+            raise ValueError("fill() needs an empty store, use add() to add to one")
+        by_id, seq, n = self._by_id, self._seq, self._next_seq
+        for rec in records:
+            sid = rec.id
+            if sid not in by_id:
+                seq[sid] = n
+                n += 1
+            by_id[sid] = rec
+        self._next_seq = n
+        by_name = self._by_name
+        for sid, rec in by_id.items():
+            by_name.setdefault(rec.name.lower(), set()).add(sid)
+        self.stats.fill(list(seq.values()), list(by_id.values()))
+        self._changed()
+
+    def update(self, sid, **changes):
+        """Changes fields of an existing record and reindexes it."""
+        if changes.get('id', sid) != sid:
+            raise ValueError("use remove() and add() to change a student's ID")
+        rec = self._by_id[sid]
+        self._unindex(rec)
+        rec.update(changes)
+        self._index(rec)
+        self._changed()
+        return rec
+
+    def remove(self, sid):
+        """Removes a record by ID and returns it."""
+        rec = self._by_id.pop(sid)
+        self._unindex(rec)
+        del self._seq[sid]
+        self._changed()
+        return rec
+
+    def remove_by_name(self, name):
+        """Removes every record with this name (case-insensitive) and returns them."""
+        ids = list(self._by_name.get(name.lower(), ()))
+        return [self.remove(sid) for sid in ids]
+
+    def _changed(self):
+        self.version += 1
+
+    def _index(self, rec):
+        sid = rec.id
+        self._by_name.setdefault(rec.name.lower(), set()).add(sid)
+        if self._grams is not None:
+            for g in _trigrams(self._key(rec)):
+                self._grams.setdefault(g, set()).add(sid)
+        self.stats.add(self._seq[sid], rec)
+        for field, idx in self._columns.items():
+            idx.add(column_value(rec, field), self._seq[sid], sid)
+
+    def _unindex(self, rec):
+        sid = rec.id
+        self.stats.remove(self._seq[sid], rec)
+        for field, idx in self._columns.items():
+            idx.remove(column_value(rec, field), self._seq[sid], sid)
+        name = rec.name.lower()
+        ids = self._by_name.get(name)
+        if ids is not None:
+            ids.discard(sid)
+            if not ids:
+                del self._by_name[name]
+        if self._grams is not None:
+            for g in _trigrams(self._key(rec)):
+                ids = self._grams.get(g)
+                if ids is not None:
+                    ids.discard(sid)
+                    if not ids:
+                        del self._grams[g]
+
+    def position(self, sid):
+        """Enrolment order of a student, used to keep results stable."""
+        return self._seq[sid]
+
+    def column_index(self, field):
+        """ValueIndex for a numeric column.
+
+        pct is the one CohortStats keeps; the others are built in one pass on
+        first use and from then on updated with each edit, like the pct one.
+        """
+        if field == "pct":
+            return self.stats.by_pct
+        idx = self._columns.get(field)
+        if idx is None:
+            idx = self._columns[field] = ValueIndex(COLUMN_DOMAINS[field])
+            # _by_id is in enrolment order, so every bucket fills in order
+            idx.fill((column_value(r, field), self._seq[sid], sid) for sid, r in self._by_id.items())
+        return idx
+
+    def rank(self, sid):
+        """Class rank of a student (1 is best, ties share a rank)."""
+        return self.stats.rank_of(calc_stats(self._by_id[sid])[2])
+
+    def search(self, query):
+        """Returns records whose name or ID contains the query, in insertion order."""
+        q = query.lower()
+        if not q:
+            return list(self._by_id.values())
+        if len(q) < 3:
+            # too short for the trigram index, and likely to match most rows anyway
+            return [r for r in self._by_id.values() if q in self._key(r)]
+
+        if self._grams is None:
+            self._grams = {}
+            for sid, rec in self._by_id.items():
+                for g in _trigrams(self._key(rec)):
+                    self._grams.setdefault(g, set()).add(sid)
+        postings = []
+        for g in _trigrams(q):
+            ids = self._grams.get(g)
+            if not ids:
+                return []
+            postings.append(ids)
+        postings.sort(key=len)
+        cands = set(postings[0]).intersection(*postings[1:])
+
+        hits = [sid for sid in cands if q in self._key(self._by_id[sid])]
+        hits.sort(key=self._seq.__getitem__)
+        return [self._by_id[sid] for sid in hits]
+
+
+def format_record(s):
+    return f"{s.id},{s.name},{s.m1},{s.m2},{s.m3},{s.exam}"
+
+
+class Student:
+    """One registry row. Slots keep large cohorts compact; s['name'] style access still works."""
+    __slots__ = ("id", "name", "m1", "m2", "m3", "exam")
+
+    def __init__(self, id, name, m1, m2, m3, exam):
+        self.id = id
+        self.name = name
+        self.m1 = m1
+        self.m2 = m2
+        self.m3 = m3
+        self.exam = exam
+
+    def __getitem__(self, field):
+        return getattr(self, field)
+
+    def __setitem__(self, field, value):
+        setattr(self, field, value)
+
+    def update(self, changes):
+        for field, value in changes.items():
+            setattr(self, field, value)
+
+    def __repr__(self):
+        return f"Student({format_record(self)})"
+
+
+def parse_record(p):
+    """Builds a record from the six comma-separated fields of a marks line."""
+    return Student(p[0], p[1], int(p[2]), int(p[3]), int(p[4]), int(p[5]))
+
+
+def validate_fields(p):
+    """Checks one row's fields and returns them as a tuple, or raises ValueError."""
+    if len(p) != 6:
+        raise ValueError(f"expected 6 fields, got {len(p)}")
+    sid, name = p[0].strip(), p[1].strip()
+    if not sid or not name:
+        raise ValueError("ID and name are required")
+    if "," in sid or "," in name:
+        raise ValueError("ID and name cannot contain commas")
+    marks = []
+    for (field, top), raw in zip(LIMITS, p[2:]):
+        try:
+            v = int(raw)
+        except ValueError:
+            raise ValueError(f"{field} must be a whole number, got '{raw.strip()}'")
+        if not 0 <= v <= top:
+            raise ValueError(f"{field} must be 0-{top}, got {v}")
+        marks.append(v)
+    return (sid, name, *marks)
+
+
+def read_marks(path):
+    """Streams records from a marks file one line at a time, skipping the count header."""
+    with open(path, "rb") as f:
+        next(f, None)
+        for line in f:
+            p = line.decode().strip().split(',')
+            if len(p) == 6:
+                yield parse_record(p)
+
+
+def write_snapshot(path, lines):
+    """Atomically replaces the marks file with the given formatted record lines."""
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(f"{len(lines)}\n")
+        for line in lines:
+            f.write(line + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+@contextmanager
+def file_lock(path):
+    """Holds an advisory exclusive lock on <path>.lock, shared by every process using path."""
+    with open(path + ".lock", "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _parse_header(raw):
+    """(base seq, generation, parent generation) from a log's first line, or None.
+
+    Logs written before generations existed have just "#<seq>"; their
+    generation comes back as None.
+    """
+    if not raw.startswith(b"#"):
+        return None
+    parts = raw[1:].decode().split()
+    try:
+        base = int(parts[0])
+    except (IndexError, ValueError):
+        return None
+    if len(parts) != 3:
+        return base, None, None
+    return base, parts[1], parts[2]
+
+
+def _read_header(path):
+    try:
+        with open(path, "rb") as f:
+            return _parse_header(f.readline())
+    except FileNotFoundError:
+        return None
+
+
+def _new_generation():
+    return os.urandom(6).hex()
+
+
+# parent of a log that starts on the bare snapshot, and of one that follows a checkpoint
+NO_LOG = "-"
+CHECKPOINT = "*"
+
+
+class MarksJournal:
+    """Append-only log of adds and deletes layered over the marks file.
+
+    Each edit is one line ("+,<record>" or "-,<id>") appended straight away and
+    fsynced in batches. Compaction moves the live log aside, writes a fresh
+    snapshot on a background thread and only then drops the old log, so a crash
+    at any point can be recovered by replaying whatever logs are still on disk.
+
+    Several portals can share one registry. Every write happens under
+    file_lock() after first catching up on edits other instances appended. Each
+    log starts with a "#<seq> <generation> <parent>" header: the number of edits
+    before it, a random name for this log, and the name of the log it carries on
+    from. refresh() follows a log by its generation, so it only reads the new
+    lines, and moves on to the next log only if that log's parent is the one it
+    was reading. A checkpoint writes a snapshot that may hold changes no log
+    records (a bulk import), so its log's parent is CHECKPOINT and every other
+    instance reloads.
+    """
+
+    def __init__(self, path, fsync_every=FSYNC_EVERY, compact_after=COMPACT_AFTER):
+        self.path = path
+        self.log_path = path + JOURNAL_SUFFIX
+        self.old_path = self.log_path + ".old"
+        self.fsync_every = fsync_every
+        self.compact_after = compact_after
+        self.store = None
+        self.entries = 0
+        self._seq = 0
+        self._log_gen = None  # generation of the log we have read up to _offset, None for none
+        self._offset = 0
+        self._unsynced = 0
+        self._lock = threading.RLock()
+        self._compactor = None
+
+    # --- reading ---
+
+    def load(self, store):
+        """Fills store from the marks file plus any edits still in the journal."""
+        with self._lock, file_lock(self.path):
+            self._load(store)
+
+    def _load(self, store):
+        store.clear()
+        if os.path.exists(self.path):
+            store.fill(read_marks(self.path))
+        self.store = store
+        self.entries = self._seq = self._offset = 0
+        self._log_gen = None
+        head = _read_header(self.log_path)
+        if head is not None and head[1] is None:
+            self._upgrade_log()
+        for log in (self.old_path, self.log_path):
+            if os.path.exists(log):
+                self._read_log(log, 0)
+
+    def _upgrade_log(self):
+        """Gives a log from before generations a header with one, so it can be told apart."""
+        tmp = self.log_path + ".tmp"
+        with open(self.log_path, "rb") as src, open(tmp, "wb") as dst:
+            head = _parse_header(src.readline()) or (0,)
+            dst.write(f"#{head[0]} {_new_generation()} {NO_LOG}\n".encode())
+            dst.write(src.read())
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(tmp, self.log_path)
+
+    def _read_log(self, log, offset):
+        """Applies a log's entries from offset on and returns how many there were."""
+        applied = 0
+        with open(log, "rb") as f:
+            f.seek(offset)
+            for raw in f:
+                if raw.startswith(b"#"):
+                    head = _parse_header(raw)
+                    if head is not None:
+                        self._seq, self._log_gen = head[0], head[1]
+                    continue
+                line = raw.decode().rstrip("\n")
+                op, _, rest = line.partition(",")
+                if op == "+":
+                    p = rest.split(",")
+                    if len(p) == 6:
+                        self.store.add(parse_record(p))
+                elif op == "-" and rest in self.store:
+                    self.store.remove(rest)
+                self._seq += 1
+                applied += 1
+            self._offset = f.tell()
+        if log == self.log_path:
+            self.entries += applied
+        return applied
+
+    def refresh(self):
+        """Applies edits other instances have made since we last looked. Returns True if anything changed."""
+        with self._lock, file_lock(self.path):
+            return self._catch_up()
+
+    def _catch_up(self):
+        head = _read_header(self.log_path)
+        if self._log_gen is None:
+            if head is None:
+                return False
+        elif head is not None and head[1] == self._log_gen:
+            return self._read_log(self.log_path, self._offset) > 0
+
+        # the log we were following has been rotated by a compaction, or replaced by a checkpoint
+        changed = False
+        if self._log_gen is not None:
+            old = _read_header(self.old_path)
+            if old is not None and old[1] == self._log_gen:
+                changed = self._read_log(self.old_path, self._offset) > 0
+                if head is None:
+                    return changed  # nobody has started a new log yet
+        if head is not None and head[2] == (self._log_gen or NO_LOG) and head[0] == self._seq:
+            self.entries = 0
+            return self._read_log(self.log_path, 0) > 0 or changed
+        # edits we never saw are now only in the snapshot
+        self._load(self.store)
+        return True
+
+    # --- writing ---
+
+    def log_add(self, s):
+        self._append("+," + format_record(s), lambda: self.store.add(s))
+
+    def log_delete(self, sid):
+        def apply():
+            if sid in self.store:
+                self.store.remove(sid)
+        self._append(f"-,{sid}", apply)
+
+    def _append(self, line, apply):
+        with self._lock, file_lock(self.path):
+            self._catch_up()
+            if not os.path.exists(self.log_path):
+                self._start_log(self._log_gen or NO_LOG)
+            with open(self.log_path, "ab") as f:
+                f.write((line + "\n").encode())
+                self._offset = f.tell()
+            # reapplied after catching up so our edit lands last, as in the log
+            apply()
+            self._seq += 1
+            self.entries += 1
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every:
+                self._sync()
+
+    def _start_log(self, parent):
+        """Starts a new live log, atomically so no reader ever sees it without its header."""
+        gen = _new_generation()
+        tmp = self.log_path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(f"#{self._seq} {gen} {parent}\n".encode())
+            self._offset = f.tell()
+        os.replace(tmp, self.log_path)
+        self._log_gen = gen
+        self.entries = 0
+
+    def sync(self):
+        """Forces logged edits to disk."""
+        with self._lock:
+            self._sync()
+
+    def _sync(self):
+        if self._unsynced and os.path.exists(self.log_path):
+            with open(self.log_path, "ab") as f:
+                os.fsync(f.fileno())
+        self._unsynced = 0
+
+    def _rotate(self, parent):
+        """Moves the live log aside so new edits start a fresh one whose parent is given."""
+        self._sync()
+        if os.path.exists(self.log_path):
+            if os.path.exists(self.old_path):
+                # an earlier compaction never finished, keep both logs
+                with open(self.log_path, "rb") as src, open(self.old_path, "ab") as dst:
+                    dst.write(b"".join(l for l in src if not l.startswith(b"#")))
+                os.remove(self.log_path)
+            else:
+                os.replace(self.log_path, self.old_path)
+        self._start_log(parent)
+
+    def _old_log(self):
+        """(generation, size) of the .old log, or None if there is none."""
+        head = _read_header(self.old_path)
+        return None if head is None else (head[1], os.path.getsize(self.old_path))
+
+    def _fold(self, lines, rotated=None):
+        """Writes the snapshot and drops the .old log.
+
+        rotated is the _old_log() seen when the snapshot lines were taken. If
+        the .old log has changed since, another instance has folded it or added
+        to it, and our lines are already out of date, so nothing is written.
+        """
+        if rotated is not None and self._old_log() != rotated:
+            return False
+        write_snapshot(self.path, lines)
+        if os.path.exists(self.old_path):
+            os.remove(self.old_path)
+        return True
+
+    def _fold_locked(self, lines, rotated):
+        with file_lock(self.path):
+            self._fold(lines, rotated)
+
+    @property
+    def compacting(self):
+        return self._compactor is not None and self._compactor.is_alive()
+
+    def needs_compaction(self):
+        return self.entries >= self.compact_after and not self.compacting
+
+    def compact(self):
+        """Folds the journal into the marks file on a background thread."""
+        with self._lock, file_lock(self.path):
+            if self.compacting:
+                return
+            self._catch_up()
+            lines = [format_record(s) for s in self.store]
+            self._rotate(self._log_gen or NO_LOG)
+            rotated = self._old_log()
+        if rotated is None:
+            return  # there was no log to fold
+        self._compactor = threading.Thread(target=self._fold_locked, args=(lines, rotated), daemon=True)
+        self._compactor.start()
+
+    def checkpoint(self, apply=None):
+        """Writes a full snapshot right now and clears the journal.
+
+        apply, if given, is called under the lock once we have caught up, to
+        make changes that go straight into the snapshot without being journaled
+        (bulk.py's import). Every other instance reloads after a checkpoint.
+        """
+        if self._compactor is not None:
+            self._compactor.join()
+        with self._lock, file_lock(self.path):
+            self._catch_up()
+            if apply is not None:
+                apply()
+            lines = [format_record(s) for s in self.store]
+            self._rotate(CHECKPOINT)
+            self._fold(lines)
+
+    def close(self):
+        if self._compactor is not None:
+            self._compactor.join()
+        self.sync()
@@ -0,0 +1,184 @@
+"""Term-end report cards for every student in the registry.
+
+    python reports.py reports/ --format html
+    python reports.py reports/ --format csv --db students.db
+
+Students are rendered in chunks by a process pool. Each chunk is written
+straight to its own part file in the output folder (part-00000.txt and so
+on), and a part only appears once it is complete. Re-running the same command
+after an interruption skips the parts that are already there.
+"""
+import argparse
+import bisect
+import csv
+import html
+import json
+import os
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from registry import Student, calc_stats, format_record, grade_cohort
+from storage import TextBackend, SQLiteBackend
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MARKS = os.path.join(SCRIPT_DIR, "studentMarks.txt")
+CHUNK_SIZE = 5000
+MANIFEST = "manifest.json"
+EXTENSIONS = {"text": "txt", "html": "html", "csv": "csv"}
+CSV_HEADER = ["id", "name", "m1", "m2", "m3", "cw_total", "exam", "percentage", "grade", "rank", "cohort"]
+
+HTML_HEAD = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Yale University - Report Cards</title>
+<style>
+body {{ font-family: Georgia, serif; color: #222; }}
+.card {{ border: 2px solid #00356b; margin: 20px auto; padding: 10px 25px; width: 520px; page-break-after: always; }}
+.card h2 {{ color: #00356b; margin-bottom: 0; }}
+.card td {{ padding: 2px 12px 2px 0; }}
+</style></head><body>
+<!-- students {first}-{last} -->
+"""
+
+
+def render_text(s, rank, cohort):
+    cw, exam, pct, grade = calc_stats(s)
+    return (f"YALE UNIVERSITY - REPORT CARD\n"
+            f"Student: {s['name']} ({s['id']})\n"
+            f"Coursework: {s['m1']} / {s['m2']} / {s['m3']}  (total {cw}/60)\n"
+            f"Exam: {exam}/100\n"
+            f"Overall: {pct}%  Grade {grade}\n"
+            f"Class rank: {rank} of {cohort}\n"
+            f"\f\n")
+
+
+def render_html(s, rank, cohort):
+    cw, exam, pct, grade = calc_stats(s)
+    return (f'<div class="card"><h2>{html.escape(s["name"])}</h2><p>Student ID {html.escape(s["id"])}</p>\n'
+            f"<table><tr><td>Coursework</td><td>{s['m1']} / {s['m2']} / {s['m3']} (total {cw}/60)</td></tr>\n"
+            f"<tr><td>Exam</td><td>{exam}/100</td></tr>\n"
+            f"<tr><td>Overall</td><td>{pct}%</td></tr>\n"
+            f"<tr><td>Grade</td><td><b>{grade}</b></td></tr>\n"
+            f"<tr><td>Class rank</td><td>{rank} of {cohort}</td></tr></table></div>\n")
+
+
+def render_chunk(out_dir, part, fmt, first, rows, cohort):
+    """Writes one part file from (id, name, m1, m2, m3, exam, rank) rows in a worker process."""
+    final = os.path.join(out_dir, part_name(part, fmt))
+    tmp = final + ".tmp"
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            w = csv.writer(f)
+            w.writerow(CSV_HEADER)
+            for *fields, rank in rows:
+                s = Student(*fields)
+                cw, exam, pct, grade = calc_stats(s)
+                w.writerow([s.id, s.name, s.m1, s.m2, s.m3, cw, exam, pct, grade, rank, cohort])
+        elif fmt == "html":
+            f.write(HTML_HEAD.format(first=first + 1, last=first + len(rows)))
+            for *fields, rank in rows:
+                f.write(render_html(Student(*fields), rank, cohort))
+            f.write("</body></html>\n")
+        else:
+            for *fields, rank in rows:
+                f.write(render_text(Student(*fields), rank, cohort))
+    # only a finished part gets its real name, which is what makes resuming safe
+    os.replace(tmp, final)
+    return part, len(rows)
+
+
+def part_name(part, fmt):
+    return f"part-{part:05d}.{EXTENSIONS[fmt]}"
+
+
+def ranked_rows(backend):
+    """Every student in enrolment order with their class rank (1 + number of higher percentages)."""
+    recs = list(backend)
+    _, pcts, _ = grade_cohort(recs)
+    ordered = sorted(pcts)
+    n = len(recs)
+    return [(s.id, s.name, s.m1, s.m2, s.m3, s.exam, n - bisect.bisect_right(ordered, pct) + 1)
+            for s, pct in zip(recs, pcts)]
+
+
+def fingerprint(rows, fmt, chunk_size):
+    """Identifies a registry snapshot plus settings, so a resume never mixes two runs."""
+    crc = 0
+    for row in rows:
+        crc = zlib.crc32(format_record(Student(*row[:6])).encode() + b"\n", crc)
+    return f"{fmt}:{chunk_size}:{len(rows)}:{crc:08x}"
+
+
+def prepare(out_dir, stamp, fresh):
+    """Creates the output folder and returns the parts already finished by an earlier run."""
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = os.path.join(out_dir, MANIFEST)
+    old = None
+    if os.path.exists(manifest):
+        with open(manifest) as f:
+            old = json.load(f).get("fingerprint")
+
+    parts = [n for n in os.listdir(out_dir) if n.startswith("part-")]
+    if old != stamp and parts and not fresh:
+        raise SystemExit(f"{out_dir} holds reports from a different registry or settings; "
+                         f"pass --fresh to replace them.")
+    if old != stamp or fresh:
+        for n in parts:
+            os.remove(os.path.join(out_dir, n))
+        parts = []
+        with open(manifest, "w") as f:
+            json.dump({"fingerprint": stamp, "created": time.strftime("%Y-%m-%d %H:%M:%S")}, f)
+    return {n for n in parts if not n.endswith(".tmp")}
+
+
+def generate(backend, out_dir, fmt="text", chunk_size=CHUNK_SIZE, workers=None, fresh=False):
+    """Renders every report card into out_dir. Returns (students written, parts skipped)."""
+    rows = ranked_rows(backend)
+    done = prepare(out_dir, fingerprint(rows, fmt, chunk_size), fresh)
+    cohort = len(rows)
+    written = skipped = 0
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # same bounded window as bulk import so only a few chunks are ever pickled at once
+        pending = []
+        for part, first in enumerate(range(0, cohort, chunk_size)):
+            if part_name(part, fmt) in done:
+                skipped += 1
+                continue
+            pending.append(pool.submit(render_chunk, out_dir, part, fmt, first,
+                                       rows[first:first + chunk_size], cohort))
+            if len(pending) >= 2 * workers:
+                written += pending.pop(0).result()[1]
+        for fut in pending:
+            written += fut.result()[1]
+    return written, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write report cards for every student in the registry.")
+    parser.add_argument("out_dir", help="folder for the part files")
+    parser.add_argument("--format", choices=sorted(EXTENSIONS), default="text")
+    parser.add_argument("--marks", default=DEFAULT_MARKS, help="registry file (default: studentMarks.txt)")
+    parser.add_argument("--db", help="read from an SQLite registry instead of the text file")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="students per part file")
+    parser.add_argument("--fresh", action="store_true", help="discard reports from an earlier run")
+    args = parser.parse_args(argv)
+
+    backend = SQLiteBackend(args.db) if args.db else TextBackend(args.marks)
+    backend.load()
+    start = time.perf_counter()
+    try:
+        written, skipped = generate(backend, args.out_dir, args.format, args.chunk_size,
+                                    args.workers, args.fresh)
+    finally:
+        backend.close()
+    elapsed = time.perf_counter() - start
+    print(f"{written} report cards in {elapsed:.2f}s ({written / elapsed if elapsed else 0:,.0f}/sec), "
+          f"{skipped} parts already done")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,405 @@
+"""Storage backends for the student registry.
+
+Both backends offer the same small interface, which is all YalePortal uses:
+load, refresh, search, get, `in`, len, add, remove_by_name, the analytics
+queries (highest, lowest, average, percentile, grade_counts), the ranking
+queries (rank, ranks, top_k, bottom_k, band_cutoffs), query (see query.py), sync
+and close.
+"""
+import math
+import sqlite3
+
+from registry import StudentStore, MarksJournal, Student, calc_stats, GRADE_BANDS
+import query as registry_query
+
+
+class TextBackend:
+    """The studentMarks.txt snapshot and journal, held in memory by a StudentStore."""
+
+    def __init__(self, path):
+        self.path = path
+        self.store = StudentStore()
+        self.journal = MarksJournal(path)
+
+    @property
+    def version(self):
+        return self.store.version
+
+    def load(self):
+        self.journal.load(self.store)
+
+    def refresh(self):
+        return self.journal.refresh()
+
+    def __len__(self):
+        return len(self.store)
+
+    def __contains__(self, sid):
+        return sid in self.store
+
+    def __iter__(self):
+        return iter(self.store)
+
+    def get(self, sid):
+        return self.store.get(sid)
+
+    def search(self, query):
+        return self.store.search(query)
+
+    def query(self, q):
+        return registry_query.run(self.store, q)
+
+    def add(self, rec):
+        self.journal.log_add(rec)
+        self._maybe_compact()
+
+    def remove_by_name(self, name):
+        self.journal.refresh()
+        removed = self.store.remove_by_name(name)
+        for s in removed:
+            self.journal.log_delete(s['id'])
+        self._maybe_compact()
+        return removed
+
+    def _maybe_compact(self):
+        if self.journal.needs_compaction():
+            self.journal.compact()
+
+    # --- analytics ---
+
+    def highest(self):
+        pct, sid = self.store.stats.highest()
+        return pct, self.store.get(sid)
+
+    def lowest(self):
+        pct, sid = self.store.stats.lowest()
+        return pct, self.store.get(sid)
+
+    def average(self):
+        return self.store.stats.average()
+
+    def percentile(self, p):
+        return self.store.stats.percentile(p)
+
+    def grade_counts(self):
+        return dict(self.store.stats.bands)
+
+    # --- ranking ---
+
+    def rank(self, sid):
+        return self.store.rank(sid)
+
+    def ranks(self, sids):
+        """{id: class rank} for a page of students."""
+        return {sid: self.store.rank(sid) for sid in sids}
+
+    def top_k(self, k):
+        return [(pct, self.store.get(sid)) for pct, sid in self.store.stats.top(k)]
+
+    def bottom_k(self, k):
+        return [(pct, self.store.get(sid)) for pct, sid in self.store.stats.bottom(k)]
+
+    def band_cutoffs(self):
+        return self.store.stats.band_cutoffs()
+
+    def save(self):
+        self.journal.checkpoint()
+
+    def sync(self):
+        self.journal.sync()
+
+    def close(self):
+        self.journal.close()
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS students (
+    seq INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    name_lower TEXT NOT NULL,
+    m1 INTEGER NOT NULL, m2 INTEGER NOT NULL, m3 INTEGER NOT NULL, exam INTEGER NOT NULL,
+    pct REAL NOT NULL,
+    grade TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS students_name ON students(name_lower);
+CREATE INDEX IF NOT EXISTS students_pct ON students(pct, seq);
+CREATE INDEX IF NOT EXISTS students_pct_desc ON students(pct DESC, seq);
+CREATE INDEX IF NOT EXISTS students_grade ON students(grade);
+CREATE INDEX IF NOT EXISTS students_exam ON students(exam, seq);
+CREATE INDEX IF NOT EXISTS students_cw ON students(m1 + m2 + m3, seq);
+"""
+
+# students per percentage (at most 161 rows), so a class rank, percentile or band share sums a few rows
+# instead of counting the table
+# (rows are created with NOT EXISTS, not OR IGNORE, which add_many's upsert would override)
+RANK_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pct_counts (pct REAL PRIMARY KEY, n INTEGER NOT NULL);
+CREATE TRIGGER IF NOT EXISTS pct_counts_ai AFTER INSERT ON students BEGIN
+    INSERT INTO pct_counts SELECT new.pct, 0 WHERE NOT EXISTS (SELECT 1 FROM pct_counts WHERE pct = new.pct);
+    UPDATE pct_counts SET n = n + 1 WHERE pct = new.pct;
+END;
+CREATE TRIGGER IF NOT EXISTS pct_counts_ad AFTER DELETE ON students BEGIN
+    UPDATE pct_counts SET n = n - 1 WHERE pct = old.pct;
+    DELETE FROM pct_counts WHERE pct = old.pct AND n = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS pct_counts_au AFTER UPDATE OF pct ON students BEGIN
+    UPDATE pct_counts SET n = n - 1 WHERE pct = old.pct;
+    DELETE FROM pct_counts WHERE pct = old.pct AND n = 0;
+    INSERT INTO pct_counts SELECT new.pct, 0 WHERE NOT EXISTS (SELECT 1 FROM pct_counts WHERE pct = new.pct);
+    UPDATE pct_counts SET n = n + 1 WHERE pct = new.pct;
+END;
+"""
+
+# trigram full-text index so substring search does not scan the table
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS students_fts USING fts5(
+    name, id, content='students', content_rowid='seq', tokenize='trigram');
+CREATE TRIGGER IF NOT EXISTS students_ai AFTER INSERT ON students BEGIN
+    INSERT INTO students_fts(rowid, name, id) VALUES (new.seq, new.name, new.id);
+END;
+CREATE TRIGGER IF NOT EXISTS students_ad AFTER DELETE ON students BEGIN
+    INSERT INTO students_fts(students_fts, rowid, name, id) VALUES ('delete', old.seq, old.name, old.id);
+END;
+CREATE TRIGGER IF NOT EXISTS students_au AFTER UPDATE ON students BEGIN
+    INSERT INTO students_fts(students_fts, rowid, name, id) VALUES ('delete', old.seq, old.name, old.id);
+    INSERT INTO students_fts(rowid, name, id) VALUES (new.seq, new.name, new.id);
+END;
+"""
+
+COLUMNS = "id, name, m1, m2, m3, exam"
+SQL_FIELDS = {
+    "id": "lower(id)", "name": "name_lower", "m1": "m1", "m2": "m2", "m3": "m3", "exam": "exam",
+    "cw": "m1 + m2 + m3", "total": "m1 + m2 + m3 + exam", "pct": "pct", "grade": "grade",
+}
+
+
+def _like(text):
+    return "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+class SQLiteBackend:
+    """Registry kept in an SQLite database (WAL mode), searched and summarised with indexed queries."""
+
+    def __init__(self, path):
+        self.path = path
+        self.version = 0
+        self.conn = None
+        self.has_fts = False
+        self._data_version = None
+
+    def load(self):
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.executescript(SCHEMA)
+            has_counts = self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'pct_counts'").fetchone() is not None
+            self.conn.executescript(RANK_SCHEMA)
+            if not has_counts:
+                # a database from before the counts table existed
+                self.conn.execute("INSERT INTO pct_counts SELECT pct, COUNT(*) FROM students GROUP BY pct")
+        try:
+            with self.conn:
+                self.conn.executescript(FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5 trigram support, fall back to LIKE scans
+            self.has_fts = False
+        self._data_version = self._read_data_version()
+        self.version += 1
+
+    def _read_data_version(self):
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def refresh(self):
+        """Notices commits made by other connections to the same database."""
+        current = self._read_data_version()
+        if current == self._data_version:
+            return False
+        self._data_version = current
+        self.version += 1
+        return True
+
+    def _rows(self, sql, params=()):
+        return [Student(*row) for row in self.conn.execute(sql, params)]
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM students").fetchone()[0]
+
+    def __contains__(self, sid):
+        return self.conn.execute("SELECT 1 FROM students WHERE id = ?", (sid,)).fetchone() is not None
+
+    def __iter__(self):
+        for row in self.conn.execute(f"SELECT {COLUMNS} FROM students ORDER BY seq"):
+            yield Student(*row)
+
+    def get(self, sid):
+        rows = self._rows(f"SELECT {COLUMNS} FROM students WHERE id = ?", (sid,))
+        return rows[0] if rows else None
+
+    def _text_clause(self, text):
+        q = text.lower()
+        if self.has_fts and len(q) >= 3:
+            phrase = '"' + q.replace('"', '""') + '"'
+            return "seq IN (SELECT rowid FROM students_fts WHERE students_fts MATCH ?)", [phrase]
+        pattern = _like(q)
+        return "(name_lower LIKE ? ESCAPE '\\' OR lower(id) LIKE ? ESCAPE '\\')", [pattern, pattern]
+
+    def search(self, query):
+        if not query:
+            return self._rows(f"SELECT {COLUMNS} FROM students ORDER BY seq")
+        where, params = self._text_clause(query)
+        return self._rows(f"SELECT {COLUMNS} FROM students WHERE {where} ORDER BY seq", params)
+
+    def query(self, q):
+        """Runs a parsed query as one SQL statement so the indexes do the filtering and sorting."""
+        where, params = [], []
+        if q.text:
+            clause, args = self._text_clause(q.text)
+            where.append(clause)
+            params += args
+        for field, op, value in q.filters:
+            expr = SQL_FIELDS[field]
+            if op == "contains":
+                where.append(f"{expr} LIKE ? ESCAPE '\\'")
+                params.append(_like(value))
+            elif op in ("in", "not in"):
+                where.append(f"{expr} {op.upper()} ({', '.join('?' * len(value))})")
+                params += sorted(value)
+            else:
+                where.append(f"{expr} {op} ?")
+                params.append(value)
+        order = [f"{SQL_FIELDS[field]}{' DESC' if desc else ''}" for field, desc in q.sort] + ["seq"]
+        sql = f"SELECT {COLUMNS} FROM students"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return self._rows(sql + " ORDER BY " + ", ".join(order), params)
+
+    @staticmethod
+    def _params(s):
+        _, _, pct, g = calc_stats(s)
+        return (s['id'], s['name'], s['name'].lower(), s['m1'], s['m2'], s['m3'], s['exam'], pct, g)
+
+    def add(self, rec):
+        self.add_many([rec])
+
+    def add_many(self, records):
+        """Inserts or replaces records in a single transaction."""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO students (id, name, name_lower, m1, m2, m3, exam, pct, grade) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET "
+                "name = excluded.name, name_lower = excluded.name_lower, m1 = excluded.m1, "
+                "m2 = excluded.m2, m3 = excluded.m3, exam = excluded.exam, "
+                "pct = excluded.pct, grade = excluded.grade",
+                (self._params(s) for s in records))
+        self.version += 1
+
+    def remove_by_name(self, name):
+        with self.conn:
+            removed = self._rows(f"SELECT {COLUMNS} FROM students WHERE name_lower = ? ORDER BY seq",
+                                 (name.lower(),))
+            self.conn.execute("DELETE FROM students WHERE name_lower = ?", (name.lower(),))
+        if removed:
+            self.version += 1
+        return removed
+
+    # --- analytics ---
+
+    def _extreme(self, order):
+        # earliest enrolled wins a tie, matching the text backend; both orders walk a (pct, seq) index
+        row = self.conn.execute(f"SELECT pct, {COLUMNS} FROM students ORDER BY pct {order}, seq LIMIT 1").fetchone()
+        return row[0], Student(*row[1:])
+
+    def highest(self):
+        return self._extreme("DESC")
+
+    def lowest(self):
+        return self._extreme("ASC")
+
+    def average(self):
+        avg = self.conn.execute("SELECT AVG(pct) FROM students").fetchone()[0]
+        return avg or 0.0
+
+    def _pct_counts(self):
+        """(pct, students) pairs, lowest pct first."""
+        return self.conn.execute("SELECT pct, n FROM pct_counts ORDER BY pct").fetchall()
+
+    def percentile(self, p):
+        """Nearest-rank percentage at percentile p (0-100), found by a running sum over the per-pct counts."""
+        counts = self._pct_counts()
+        k = max(1, math.ceil(p / 100 * sum(n for _, n in counts)))
+        for pct, n in counts:
+            k -= n
+            if k <= 0:
+                return pct
+        raise IndexError("percentile of an empty registry")
+
+    def grade_counts(self):
+        counts = {g: 0 for _, g in GRADE_BANDS}
+        counts['F'] = 0
+        for g, n in self.conn.execute("SELECT grade, COUNT(*) FROM students GROUP BY grade"):
+            counts[g] = n
+        return counts
+
+    # --- ranking ---
+
+    def rank(self, sid):
+        return self.ranks([sid])[sid]
+
+    def ranks(self, sids):
+        """{id: class rank} for a page of students, in one query over the per-pct counts."""
+        sids = list(sids)
+        if not sids:
+            return {}
+        return dict(self.conn.execute(
+            "SELECT s.id, 1 + COALESCE((SELECT SUM(c.n) FROM pct_counts c WHERE c.pct > s.pct), 0) "
+            f"FROM students s WHERE s.id IN ({', '.join('?' * len(sids))})", sids))
+
+    def _ranked(self, order, k):
+        rows = self.conn.execute(f"SELECT pct, {COLUMNS} FROM students ORDER BY pct {order}, seq LIMIT ?", (k,))
+        return [(row[0], Student(*row[1:])) for row in rows]
+
+    def top_k(self, k):
+        return self._ranked("DESC", k)
+
+    def bottom_k(self, k):
+        return self._ranked("ASC", k)
+
+    def band_cutoffs(self):
+        counts = self._pct_counts()
+        n = sum(c for _, c in counts)
+        if not n:
+            return {}
+        shares = {}
+        for cutoff, g in GRADE_BANDS:
+            at_or_above = sum(c for pct, c in counts if pct >= cutoff)
+            shares[g] = round(at_or_above / n * 100, 1)
+        shares['F'] = 100.0
+        return shares
+
+    def save(self):
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def sync(self):
+        pass
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def migrate(text_path, db_path):
+    """One-shot copy of studentMarks.txt (and its journal) into an SQLite database."""
+    src = TextBackend(text_path)
+    src.load()
+    dst = SQLiteBackend(db_path)
+    dst.load()
+    dst.add_many(src)
+    dst.save()
+    count = len(dst)
+    dst.close()
+    return count
@@ -0,0 +1,260 @@
+"""Headless tests for the registry data layer.
+
+    python -m unittest test_registry
+"""
+import math
+import os
+import random
+import shutil
+import tempfile
+import threading
+import unittest
+
+import query
+from registry import StudentStore, MarksJournal, Student, format_record, calc_stats
+
+
+def rows(store):
+    return {s.id: format_record(s) for s in store}
+
+
+def write_marks(directory):
+    path = os.path.join(directory, "studentMarks.txt")
+    with open(path, "w") as f:
+        f.write("2\n1,John Curry,8,15,7,45\n2,Sam Sturtivant,14,15,14,77\n")
+    return path
+
+
+def random_student(rng, sid):
+    return Student(sid, f"Student {rng.randint(0, 999)}", rng.randint(0, 20), rng.randint(0, 20),
+                   rng.randint(0, 20), rng.randint(0, 100))
+
+
+class JournalTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = write_marks(self.dir)
+        self.journals = []
+
+    def tearDown(self):
+        for j in self.journals:
+            j.close()
+        shutil.rmtree(self.dir)
+
+    def open(self, **kwargs):
+        j = MarksJournal(self.path, **kwargs)
+        j.load(StudentStore())
+        self.journals.append(j)
+        return j
+
+    def fresh(self, path=None):
+        """What a portal started right now would load."""
+        j = MarksJournal(path or self.path)
+        store = StudentStore()
+        j.load(store)
+        return rows(store)
+
+
+class MultiInstanceTest(JournalTestCase):
+    """Several portals on one file must agree with the order their edits happened in."""
+
+    def run_steps(self, seed, path, steps=400, instances=3):
+        rng = random.Random(seed)
+        js = [MarksJournal(path, compact_after=7) for _ in range(instances)]
+        try:
+            for j in js:
+                j.load(StudentStore())
+            model = rows(js[0].store)
+            ids = [str(i) for i in range(1, 25)]
+            for step in range(steps):
+                j = rng.choice(js)
+                op = rng.random()
+                if op < 0.45:
+                    s = random_student(rng, rng.choice(ids))
+                    j.log_add(s)
+                    model[s.id] = format_record(s)
+                elif op < 0.7:
+                    sid = rng.choice(ids)
+                    j.log_delete(sid)
+                    model.pop(sid, None)
+                elif op < 0.85:
+                    j.refresh()
+                elif op < 0.92:
+                    j.checkpoint()
+                else:
+                    # a bulk import: changes that only ever reach the snapshot
+                    s = random_student(rng, rng.choice(ids))
+                    j.checkpoint(lambda: j.store.add(s))
+                    model[s.id] = format_record(s)
+                if j.needs_compaction():
+                    j.compact()
+                self.assertEqual(self.fresh(path), model, f"seed {seed}, step {step}")
+            for j in js:
+                j.refresh()
+                self.assertEqual(rows(j.store), model, f"seed {seed}, after refresh")
+        finally:
+            # before the directory holding their file goes away
+            for j in js:
+                j.close()
+
+    def test_random_edits_across_instances(self):
+        for seed in range(8):
+            with self.subTest(seed=seed), tempfile.TemporaryDirectory() as d:
+                self.run_steps(seed, write_marks(d))
+
+    def test_follower_reloads_after_checkpoint(self):
+        a, b = self.open(), self.open()
+        b.checkpoint(lambda: b.store.add(Student("9", "Alan Shearer", 20, 20, 20, 100)))
+        self.assertTrue(a.refresh())
+        self.assertIn("9", a.store)
+        a.checkpoint()
+        self.assertIn("9", self.fresh())
+
+    def test_import_survives_a_checkpoint_by_another_portal(self):
+        a, b = self.open(), self.open()
+        a.log_add(Student("3", "Lee Scott", 17, 11, 16, 99))
+        a.checkpoint()
+        # b never looked at the registry after a's checkpoint; its import still lands on top
+        b.checkpoint(lambda: b.store.add(Student("9", "Alan Shearer", 20, 20, 20, 100)))
+        self.assertEqual(set(self.fresh()), {"1", "2", "3", "9"})
+
+
+class HeldBackFoldTest(JournalTestCase):
+    """A background fold that runs late must not overwrite a newer snapshot."""
+
+    def hold_fold(self, j):
+        gate = threading.Event()
+        fold = j._fold_locked
+
+        def held(*args):
+            gate.wait()
+            fold(*args)
+        j._fold_locked = held
+        return gate
+
+    def test_checkpoint_before_held_fold(self):
+        a, b = self.open(), self.open()
+        gate = self.hold_fold(a)
+        a.log_add(Student("4", "Matt Thompson", 19, 11, 15, 81))
+        a.compact()
+        b.log_add(Student("3", "Lee Scott", 17, 11, 16, 99))
+        b.checkpoint()
+        gate.set()
+        a.close()
+        self.assertEqual(set(self.fresh()), {"1", "2", "3", "4"})
+
+    def test_compaction_before_held_fold(self):
+        a, b = self.open(), self.open()
+        gate = self.hold_fold(a)
+        a.log_add(Student("4", "Matt Thompson", 19, 11, 15, 81))
+        a.compact()
+        b.log_add(Student("3", "Lee Scott", 17, 11, 16, 99))
+        b.compact()
+        b.close()
+        gate.set()
+        a.close()
+        self.assertEqual(set(self.fresh()), {"1", "2", "3", "4"})
+        self.assertFalse(os.path.exists(a.old_path))
+
+
+class CohortStatsTest(unittest.TestCase):
+    """The incremental aggregates must match a sort of the whole cohort after every edit."""
+
+    def test_matches_brute_force(self):
+        rng = random.Random(1)
+        store = StudentStore()
+        for step in range(3000):
+            sid = str(rng.randrange(300))
+            if sid in store and rng.random() < 0.4:
+                store.remove(sid)
+            else:
+                s = random_student(rng, sid)
+                if rng.random() < 0.01:
+                    s.exam = rng.choice((-5, 150))  # out of range, as a hand-edited file might have
+                store.add(s)
+            if step % 37 or not len(store):
+                continue
+            ranked = sorted((calc_stats(s)[2], store.position(s.id), s.id) for s in store)
+            stats = store.stats
+            top = max(p for p, _, _ in ranked)
+            self.assertEqual(stats.lowest(), (ranked[0][0], ranked[0][2]))
+            self.assertEqual(stats.highest(), next((p, sid) for p, _, sid in ranked if p == top))
+            for q in (0, 1, 25, 50, 75, 99, 100):
+                self.assertEqual(stats.percentile(q), ranked[max(1, math.ceil(q / 100 * len(ranked))) - 1][0])
+            for s in list(store)[:20]:
+                pct = calc_stats(s)[2]
+                self.assertEqual(store.rank(s.id), 1 + sum(p > pct for p, _, _ in ranked))
+            best = sorted(ranked, key=lambda e: (-e[0], e[1]))
+            self.assertEqual(stats.top(5), [(p, sid) for p, _, sid in best[:5]])
+            self.assertEqual(stats.bottom(5), [(p, sid) for p, _, sid in ranked[:5]])
+            self.assertEqual(stats.band_cutoffs()['A'],
+                             round(sum(p >= 70 for p, _, _ in ranked) / len(ranked) * 100, 1))
+
+
+class StoreFillTest(unittest.TestCase):
+    """Loading in bulk must give the same store as adding one record at a time."""
+
+    def test_fill_matches_add(self):
+        rng = random.Random(3)
+        recs = [random_student(rng, str(rng.randrange(500))) for _ in range(1500)]
+        added, filled = StudentStore(), StudentStore()
+        for s in recs:
+            added.add(s)
+        filled.fill(recs)
+        self.assertEqual(list(rows(filled).items()), list(rows(added).items()))
+        self.assertEqual(filled.stats.top(50), added.stats.top(50))
+        self.assertEqual(filled.stats.average(), added.stats.average())
+        self.assertEqual(filled.stats.bands, added.stats.bands)
+        filled.remove(recs[0].id)
+        added.remove(recs[0].id)
+        for text in ("student 1", "t 99", "42"):
+            self.assertEqual([s.id for s in filled.search(text)], [s.id for s in added.search(text)], text)
+        filled.add(Student("new", "Student 424242", 1, 2, 3, 4))
+        self.assertEqual([s.id for s in filled.search("424242")], ["new"])
+
+
+class QueryTest(unittest.TestCase):
+    """Indexed queries must give what filtering and sorting the whole registry would."""
+
+    QUERIES = ["exam>=80", "grade:A", "grade:F", "cw<30 sort:-pct", "sort:exam", "sort:-total",
+               "m1=20", "pct>50 pct<=75", "student 1 exam>50", "total>=100 sort:name", "exam>=79.5 m2<=3"]
+
+    def test_matches_brute_force(self):
+        rng = random.Random(2)
+        store = StudentStore()
+        for step in range(2000):
+            sid = str(rng.randrange(400))
+            if sid in store and rng.random() < 0.3:
+                store.remove(sid)
+            else:
+                store.add(random_student(rng, sid))
+            if step % 97:
+                continue
+            for text in self.QUERIES:
+                q = query.parse_query(text)
+                expected = [s for s in store if q.matches(s)]
+                query.sort_records(expected, q.sort, store)
+                self.assertEqual([s.id for s in query.run(store, q)], [s.id for s in expected], text)
+
+    def test_grade_terms(self):
+        rng = random.Random(4)
+        store = StudentStore(random_student(rng, str(i)) for i in range(600))
+        wanted = {"grade!=A,B": "CDF", "grade!=f": "ABCD", "grade>B": "A", "grade>=B": "AB",
+                  "grade<C": "DF", "grade<=C": "CDF", "grade>=F": "ABCDF", "grade<=A": "ABCDF",
+                  "grade>A": "", "grade<F": "", "grade>=D sort:-pct": "ABCD"}
+        for text, grades in wanted.items():
+            q = query.parse_query(text)
+            expected = [s for s in store if calc_stats(s)[3] in grades]
+            query.sort_records(expected, q.sort, store)
+            self.assertEqual([s.id for s in query.run(store, q)], [s.id for s in expected], text)
+            self.assertEqual([s.id for s in store if q.matches(s)], [s.id for s in store if calc_stats(s)[3] in grades],
+                             text)
+
+    def test_grade_comparison_takes_one_grade(self):
+        for text in ("grade>A,B", "grade<=C,D", "grade>E"):
+            with self.assertRaises(query.QueryError, msg=text):
+                query.parse_query(text)
+
+
+if __name__ == "__main__":
+    unittest.main()
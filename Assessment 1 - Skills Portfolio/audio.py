@@ -0,0 +1,281 @@
+"""Shared sound player for the portfolio apps.
+
+One AudioService per app owns a single long-lived thread. Sounds are read and
+decoded once by load(); play(), loop() and stop_loop() just put a request on
+the thread's queue, so a button click never touches the disk or starts a thread.
+
+Backends, best first:
+  sounddevice  mixes effects over the looping music in real time (any OS)
+  winsound     Windows only and cannot mix: an effect cuts off the music (and any
+               effect still playing) and the music restarts once it has finished
+  null         does nothing, e.g. on a headless Linux box
+"""
+import queue
+import sys
+import threading
+import time
+import wave
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MIX_RATE = 44100
+MIX_CHANNELS = 2
+BLOCK_FRAMES = 1024
+
+
+def decode_wav(path, rate=MIX_RATE, channels=MIX_CHANNELS):
+    """Reads a PCM WAV file into interleaved 16-bit samples at the mixer's rate and channel count."""
+    with wave.open(path, "rb") as w:
+        width, src_channels, src_rate = w.getsampwidth(), w.getnchannels(), w.getframerate()
+        raw = w.readframes(w.getnframes())
+    if width == 1:
+        samples = array("h", ((b - 128) << 8 for b in raw))
+    elif width == 2:
+        samples = array("h")
+        samples.frombytes(raw)
+        if sys.byteorder == "big":
+            samples.byteswap()
+    else:
+        raise ValueError(f"{path}: only 8 and 16-bit WAV files are supported")
+
+    frames = len(samples) // src_channels
+    if src_channels != channels or src_rate != rate:
+        # nearest-sample resampling and channel copy/drop; plenty for short UI sounds
+        out_frames = frames * rate // src_rate
+        out = array("h", bytes(2 * out_frames * channels))
+        for i in range(out_frames):
+            base = (i * src_rate // rate) * src_channels
+            for c in range(channels):
+                out[i * channels + c] = samples[base + min(c, src_channels - 1)]
+        samples = out
+    return samples
+
+
+class NullBackend:
+    name = "null"
+
+    def prepare(self, path):
+        return path
+
+    def busy(self):
+        return False
+
+    def play(self, sound):
+        pass
+
+    def start_loop(self, sound):
+        pass
+
+    def stop_loop(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class WinsoundBackend(NullBackend):
+    """winsound can only play one sound at a time, so effects interrupt the music.
+
+    Effects play asynchronously (winsound cannot do that from memory, so from
+    the file), each one cutting off the last, and pump() brings the music back
+    when the latest has had time to finish. The audio thread never waits on a
+    sound, so effects asked for in quick succession cannot queue up behind it.
+    """
+    name = "winsound"
+
+    def __init__(self):
+        import winsound
+        self.ws = winsound
+        self.looping = None
+        self.resume_at = None  # time.monotonic() at which to restart the music
+
+    def prepare(self, path):
+        with wave.open(path, "rb") as w:
+            return path, w.getnframes() / w.getframerate()
+
+    def busy(self):
+        return self.resume_at is not None
+
+    def play(self, sound):
+        path, seconds = sound
+        self.ws.PlaySound(path, self.ws.SND_FILENAME | self.ws.SND_ASYNC | self.ws.SND_NODEFAULT)
+        if self.looping:
+            self.resume_at = time.monotonic() + seconds
+
+    def pump(self):
+        wait = self.resume_at - time.monotonic()
+        if wait > 0:
+            time.sleep(min(wait, 0.02))
+        else:
+            self.start_loop(self.looping)
+
+    def start_loop(self, sound):
+        self.looping = sound
+        self.resume_at = None
+        self.ws.PlaySound(sound[0], self.ws.SND_FILENAME | self.ws.SND_ASYNC | self.ws.SND_LOOP)
+
+    def stop_loop(self):
+        self.looping = None
+        self.resume_at = None
+        self.ws.PlaySound(None, 0)
+
+
+class MixerBackend(NullBackend):
+    """Streams mixed blocks to the sound card through sounddevice (PortAudio)."""
+    name = "sounddevice"
+
+    def __init__(self):
+        import sounddevice
+        self.stream = sounddevice.RawOutputStream(samplerate=MIX_RATE, channels=MIX_CHANNELS,
+                                                  dtype="int16", blocksize=BLOCK_FRAMES)
+        self.stream.start()
+        self.music = None
+        self.music_pos = 0
+        self.effects = []  # [samples, position] pairs still playing
+
+    def prepare(self, path):
+        samples = decode_wav(path)
+        return np.frombuffer(samples.tobytes(), dtype=np.int16) if np is not None else samples
+
+    def busy(self):
+        return self.music is not None or bool(self.effects)
+
+    def play(self, sound):
+        self.effects.append([sound, 0])
+
+    def start_loop(self, sound):
+        if self.music is not sound:
+            self.music, self.music_pos = sound, 0
+
+    def stop_loop(self):
+        self.music = None
+
+    def _take(self, sound, pos, n, looping):
+        if not looping:
+            return sound[pos:pos + n], pos + n
+        chunk = sound[pos:pos + n]
+        while len(chunk) < n:
+            chunk = chunk + sound[:n - len(chunk)] if np is None else np.concatenate((chunk, sound[:n - len(chunk)]))
+        return chunk, (pos + n) % len(sound)
+
+    def pump(self):
+        """Mixes one block and hands it to the stream, which blocks until there is room."""
+        n = BLOCK_FRAMES * MIX_CHANNELS
+        parts = []
+        if self.music is not None and len(self.music):
+            chunk, self.music_pos = self._take(self.music, self.music_pos, n, True)
+            parts.append(chunk)
+        for e in self.effects:
+            chunk, e[1] = self._take(e[0], e[1], n, False)
+            parts.append(chunk)
+        self.effects = [e for e in self.effects if e[1] < len(e[0])]
+        self.stream.write(mix(parts, n))
+
+    def close(self):
+        self.stream.stop()
+        self.stream.close()
+
+
+def mix(parts, n):
+    """Adds sample blocks together with clipping and returns n samples of int16 bytes."""
+    if np is not None:
+        total = np.zeros(n, dtype=np.int32)
+        for p in parts:
+            total[:len(p)] += p
+        return np.clip(total, -32768, 32767).astype(np.int16).tobytes()
+    total = [0] * n
+    for p in parts:
+        for i, v in enumerate(p):
+            total[i] += v
+    return array("h", (-32768 if v < -32768 else 32767 if v > 32767 else v for v in total)).tobytes()
+
+
+def pick_backend():
+    for backend in (MixerBackend, WinsoundBackend):
+        try:
+            return backend()
+        except Exception:
+            continue
+    return NullBackend()
+
+
+class AudioService:
+    """Plays preloaded sounds from one background thread fed through a queue."""
+
+    def __init__(self, backend=None):
+        self.backend = backend or pick_backend()
+        self.sounds = {}
+        self._loading = set()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="audio", daemon=True)
+        self._thread.start()
+
+    def load(self, name, path):
+        """Reads and decodes a sound once. Returns False if it is missing or unreadable."""
+        if not path:
+            return False
+        try:
+            self.sounds[name] = self.backend.prepare(path)
+            return True
+        except (OSError, EOFError, ValueError, wave.Error) as e:
+            print(f"Audio Error: {e}")
+            return False
+
+    def load_later(self, name, path):
+        """Like load, but decodes on the audio thread; plays asked for meanwhile wait for it."""
+        if path:
+            self._loading.add(name)
+            self._queue.put(("load", (name, path)))
+
+    def play(self, name):
+        if name in self.sounds or name in self._loading:
+            self._queue.put(("play", name))
+
+    def loop(self, name):
+        if name in self.sounds or name in self._loading:
+            self._queue.put(("loop", name))
+
+    def stop_loop(self):
+        self._queue.put(("stop", None))
+
+    def close(self):
+        self._queue.put(("close", None))
+        self._thread.join(timeout=1)
+
+    def _run(self):
+        backend = self.backend
+        while True:
+            # sleep on the queue when idle; while sound is playing only drain what is waiting
+            try:
+                cmd = self._queue.get(block=not backend.busy())
+            except queue.Empty:
+                cmd = None
+            while cmd is not None:
+                op, name = cmd
+                try:
+                    if op == "close":
+                        backend.close()
+                        return
+                    if op == "load":
+                        self.load(*name)
+                        self._loading.discard(name[0])
+                    elif op in ("play", "loop") and name not in self.sounds:
+                        pass  # its file turned out to be missing or unreadable
+                    elif op == "play":
+                        backend.play(self.sounds[name])
+                    elif op == "loop":
+                        backend.start_loop(self.sounds[name])
+                    else:
+                        backend.stop_loop()
+                except Exception as e:
+                    print(f"Audio Error: {e}")
+                try:
+                    cmd = self._queue.get_nowait()
+                except queue.Empty:
+                    cmd = None
+            if backend.busy():
+                backend.pump()
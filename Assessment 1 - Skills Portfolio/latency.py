@@ -0,0 +1,23 @@
+"""Latency summaries shared by the portfolio's benchmarks and timing reports.
+
+Percentiles are nearest-rank, as in the Student Manager's analytics: the p-th
+percentile of n samples is the ceil(p/100 * n)-th smallest.
+"""
+import math
+
+
+def nearest_rank(ordered, p):
+    """The p-th percentile (0-100) of an ascending, non-empty list."""
+    return ordered[max(1, math.ceil(p / 100 * len(ordered))) - 1]
+
+
+def latency_summary(samples, points=(50, 90, 99)):
+    """Count, percentiles and max of samples given in seconds, reported in milliseconds; {} for none."""
+    if not samples:
+        return {}
+    s = sorted(samples)
+    summary = {"count": len(s)}
+    for p in points:
+        summary[f"p{p}_ms"] = round(nearest_rank(s, p) * 1000, 3)
+    summary["max_ms"] = round(s[-1] * 1000, 3)
+    return summary
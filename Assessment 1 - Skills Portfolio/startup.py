@@ -0,0 +1,110 @@
+"""Startup timing and background loading shared by the portfolio apps.
+
+Each app imports this module before anything heavy and calls PROFILE.mark()
+after each step of its start-up. Run an app with --profile-startup to print how
+long each step took and when the first frame appeared, e.g.
+
+    python quiz.py --profile-startup
+
+Slow work (decoding images, reading corpora, loading the registry) goes through
+run_in_background, so the first window appears before it is done; a picture
+read that way is put behind the window with place_background.
+"""
+import queue
+import sys
+import threading
+import time
+
+POLL_MS = 20
+
+_STARTED = time.perf_counter()
+
+
+class StartupProfile:
+    """Named start-up phases, each timed from the previous mark."""
+
+    def __init__(self, started=_STARTED):
+        self.started = started
+        self.last = started
+        self.phases = []   # (name, took seconds, at seconds since start)
+        self.enabled = False
+        self.first_frame = None
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last, now - self.started))
+        self.last = now
+
+    def background(self, name, took):
+        """Records a task that ran off the Tk thread; it only counts once it lands."""
+        at = time.perf_counter() - self.started
+        self.phases.append((f"{name} (background)", took, at))
+        if self.enabled and self.first_frame is not None:
+            print(f"{at * 1000:9.1f} ms  {took * 1000:8.1f} ms  {name} (background, after first frame)",
+                  file=sys.stderr)
+
+    def watch(self, root):
+        """Marks the first frame once Tk has drawn the initial window."""
+        def drawn():
+            root.update_idletasks()
+            self.mark("first frame")
+            self.first_frame = self.phases[-1][2]
+            if self.enabled:
+                self.report()
+        root.after_idle(drawn)
+
+    def report(self, out=sys.stderr):
+        print(f"{'at':>12}  {'took':>11}  phase", file=out)
+        for name, took, at in self.phases:
+            print(f"{at * 1000:9.1f} ms  {took * 1000:8.1f} ms  {name}", file=out)
+
+
+PROFILE = StartupProfile()
+
+
+def run_in_background(root, work, done, name=None):
+    """Runs work() on a thread and hands its result to done() on the Tk thread via after()."""
+    results = queue.Queue()
+
+    def run():
+        start = time.perf_counter()
+        try:
+            results.put((True, work(), time.perf_counter() - start))
+        except Exception as e:
+            results.put((False, e, time.perf_counter() - start))
+
+    def poll():
+        try:
+            ok, value, took = results.get_nowait()
+        except queue.Empty:
+            root.after(POLL_MS, poll)
+            return
+        if name:
+            PROFILE.background(name, took)
+        if ok:
+            done(value)
+        else:
+            print(f"Background Error ({name or 'task'}): {value}")
+
+    threading.Thread(target=run, daemon=True).start()
+    root.after(POLL_MS, poll)
+
+
+def read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def place_background(parent, data):
+    """Shows image bytes behind everything else in parent; returns the label, or None if they would not decode."""
+    import tkinter as tk
+    try:
+        img = tk.PhotoImage(data=data)
+    except tk.TclError as e:
+        print(f"Image Error: {e}")
+        return None
+    label = tk.Label(parent, image=img)
+    label.image = img  # Tk drops an image Python no longer references
+    label.place(x=0, y=0, relwidth=1, relheight=1)
+    label.lower()
+    return label